@@ -0,0 +1,192 @@
+"""JSON API расписания для киоска на ресепшене и мобильного приложения.
+
+Версия в пути (``/api/v1/...``), только чтение: уроки, группы, направления,
+преподаватели. ``?fields=id,start_dt,spots_left`` оставляет в ответе только
+перечисленные поля верхнего уровня; неизвестное поле — 400.
+
+Свободные места берутся из ``Lesson.seats_taken`` (счётчик ведёт
+``booking``), так что страница уроков — один запрос без подсчёта записей.
+
+ETag ответа строится из версии расписания (``cache.schedule_version``),
+начала текущего окна ``API_ETAG_WINDOW`` и адреса запроса, поэтому при
+совпадающем ``If-None-Match`` 304 отдаётся без единого запроса к БД. Окно
+нужно списку уроков: «будущие» отсчитываются от его начала, и прошедшие
+уроки уходят из ответа не позже, чем через ``API_ETAG_WINDOW`` секунд.
+Версия общая для всех воркеров (см. ``cache``), так что запись на урок в
+одном воркере сразу меняет ETag в остальных.
+"""
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, make_response, request
+
+from assets import asset_url, image_path
+from cache import schedule_version
+from models import db, Direction, Group, Lesson, Teacher
+from queries import GROUP_ROW, LESSON_CARD, TEACHER_CARD, lesson_filters_from_args, lesson_page, lesson_to_dict
+
+
+bp = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+LESSON_FIELDS = ('id', 'start_dt', 'duration_minutes', 'group', 'direction', 'teacher',
+                 'capacity', 'seats_taken', 'spots_left')
+GROUP_FIELDS = ('id', 'name', 'location', 'capacity', 'direction', 'teacher')
+DIRECTION_FIELDS = ('id', 'name', 'description', 'photo_url')
+TEACHER_FIELDS = ('id', 'name', 'stage_name', 'bio')
+
+
+class APIError(ValueError):
+    pass
+
+
+def _window_start():
+    """Начало текущего окна ``API_ETAG_WINDOW`` (unix-время)."""
+    window = current_app.config['API_ETAG_WINDOW']
+    return int(time.time() // window * window)
+
+
+def versioned(view):
+    """ETag из версии расписания; 304 отдаётся до вызова view."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        raw = f'{schedule_version()}|{_window_start()}|{request.full_path}'
+        etag = hashlib.sha1(raw.encode()).hexdigest()
+        if etag in request.if_none_match:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # хранить можно, но перед показом — перепроверить (это дёшево)
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+def _fields(allowed):
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise APIError(f'неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def _pick(data, fields):
+    return data if fields is None else {name: data[name] for name in fields}
+
+
+def lesson_dict(lesson):
+    capacity = lesson.group.capacity if lesson.group else None
+    return {
+        **lesson_to_dict(lesson),
+        'capacity': capacity,
+        'seats_taken': lesson.seats_taken,
+        'spots_left': max(capacity - lesson.seats_taken, 0) if capacity is not None else None,
+    }
+
+
+def group_dict(group):
+    direction, teacher = group.direction, group.teacher
+    return {
+        'id': group.id,
+        'name': group.name,
+        'location': group.location,
+        'capacity': group.capacity,
+        'direction': {'id': direction.id, 'name': direction.name} if direction else None,
+        'teacher': {'id': teacher.id, 'name': teacher.user.name} if teacher and teacher.user else None,
+    }
+
+
+def direction_dict(direction):
+    photo = image_path(direction.photo)
+    return {
+        'id': direction.id,
+        'name': direction.name,
+        'description': direction.description,
+        'photo_url': asset_url(photo) if photo else None,
+    }
+
+
+def teacher_dict(teacher):
+    return {
+        'id': teacher.id,
+        'name': teacher.user.name if teacher.user else None,
+        'stage_name': teacher.stage_name,
+        'bio': teacher.bio,
+    }
+
+
+@bp.errorhandler(APIError)
+def _api_error(e):
+    return jsonify(error=str(e)), 400
+
+
+@bp.errorhandler(404)
+def _not_found(e):
+    return jsonify(error='не найдено'), 404
+
+
+@bp.route('/lessons')
+@versioned
+def lessons():
+    """Будущие уроки с фильтрами ``/lessons`` (``window``, ``date``, ``*_id``, ``cursor``, ``limit``)."""
+    fields = _fields(LESSON_FIELDS)
+    try:
+        filters = lesson_filters_from_args(request.args)
+    except ValueError as e:
+        raise APIError(str(e))
+    filters.setdefault('start', datetime.fromtimestamp(_window_start()))
+    page = lesson_page(**filters)
+    return jsonify(lessons=[_pick(lesson_dict(l), fields) for l in page.items], next_cursor=page.next_cursor)
+
+
+@bp.route('/lessons/<int:lid>')
+@versioned
+def lesson(lid):
+    fields = _fields(LESSON_FIELDS)
+    item = Lesson.query.options(*LESSON_CARD).filter_by(id=lid).first_or_404()
+    return jsonify(_pick(lesson_dict(item), fields))
+
+
+@bp.route('/groups')
+@versioned
+def groups():
+    fields = _fields(GROUP_FIELDS)
+    items = Group.query.options(*GROUP_ROW).order_by(Group.id).all()
+    return jsonify(groups=[_pick(group_dict(g), fields) for g in items])
+
+
+@bp.route('/groups/<int:group_id>')
+@versioned
+def group(group_id):
+    fields = _fields(GROUP_FIELDS)
+    item = Group.query.options(*GROUP_ROW).filter_by(id=group_id).first_or_404()
+    return jsonify(_pick(group_dict(item), fields))
+
+
+@bp.route('/directions')
+@versioned
+def directions():
+    fields = _fields(DIRECTION_FIELDS)
+    items = db.session.scalars(db.select(Direction).order_by(Direction.id)).all()
+    return jsonify(directions=[_pick(direction_dict(d), fields) for d in items])
+
+
+@bp.route('/teachers')
+@versioned
+def teachers():
+    fields = _fields(TEACHER_FIELDS)
+    items = Teacher.query.options(*TEACHER_CARD).order_by(Teacher.id).all()
+    return jsonify(teachers=[_pick(teacher_dict(t), fields) for t in items])
+
+
+def init_api(app):
+    app.config.setdefault('API_ETAG_WINDOW', 300)
+    app.register_blueprint(bp)
@@ -1,168 +1,104 @@
-from datetime import datetime, timedelta, timezone
-
-from flask import Flask, render_template, request, redirect, url_for, flash, session, abort
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.exc import IntegrityError
-from werkzeug.security import generate_password_hash, check_password_hash
+import io
+import math
+from datetime import date, datetime, time, timedelta
+
+import click
+from flask import (Flask, Response, render_template, request, redirect, url_for, flash, abort, jsonify,
+                   make_response, stream_with_context)
+from flask_migrate import upgrade
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import joinedload
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import attendance
+import booking as booking_service
+import exports
+import jobs
+import passwords
+import scheduling
+import timeline
+from config import load_config, init_db_config, effective_settings
+from api import init_api
+from assets import init_assets
+from cache import init_page_cache, cached_page
+from identity import init_identity, current_user, current_identity, login_user, logout_user, require_role
+from importer import import_students
+from models import db, User, Direction, Teacher, Student, Group, Lesson, Subscription, Abonement, Booking, Job
+from profiling import init_profiling, metrics as profiling_metrics
+from stats import dashboard_stats, rebuild as rebuild_stats
+from schema import init_migrations
+from ratelimit import init_ratelimit, login_limiter
+from queries import (
+    init_query_counter, LESSON_CARD, GROUP_ROW, TEACHER_CARD, LESSON_DETAIL,
+    STUDENT_BOOKING_ROW, ADMIN_STUDENT_ROW, lesson_page, lesson_filters_from_args, lesson_to_dict, decode_cursor,
+)
 
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'change-me-to-a-random-secret-for-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///studio.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-
-
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
-    name = db.Column(db.String(120), nullable=False)
-    role = db.Column(db.String(20), nullable=False)
-    teacher = db.relationship('Teacher', uselist=False, back_populates='user')
-    student = db.relationship('Student', uselist=False, back_populates='user')
-
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-
-class Direction(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False)
-    description = db.Column(db.Text, nullable=True)
-    photo = db.Column(db.String(200), nullable=True)
-    groups = db.relationship('Group', back_populates='direction')
-
-
-class Teacher(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    bio = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    user = db.relationship('User', back_populates='teacher')
-    groups = db.relationship('Group', back_populates='teacher')
-    stage_name = db.Column(db.String(100), nullable=True)
-
-
-class Student(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    phone = db.Column(db.String(50))
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    user = db.relationship('User', back_populates='student')
-    tablename = 'student'
-    bookings = db.relationship('Booking', back_populates='student', cascade='all, delete-orphan')
-    payments = db.relationship('Payment', back_populates='student')
-    group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=True)
-    group = db.relationship('Group', back_populates='students')
-
-
-class Group(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False)
-    direction_id = db.Column(db.Integer, db.ForeignKey('direction.id'))
-    direction = db.relationship('Direction', back_populates='groups')
-    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'))
-    teacher = db.relationship('Teacher', back_populates='groups')
-    capacity = db.Column(db.Integer, nullable=False, default=12)
-    location = db.Column(db.String(200), nullable=True)
-    lessons = db.relationship('Lesson', back_populates='group')
-    students = db.relationship('Student', back_populates='group')
-
-
-class Lesson(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    group_id = db.Column(db.Integer, db.ForeignKey('group.id'))
-    group = db.relationship('Group', back_populates='lessons')
-    start_dt = db.Column(db.DateTime, nullable=False)
-    duration_minutes = db.Column(db.Integer, default=60)
-    bookings = db.relationship('Booking', back_populates='lesson')
-
-
-class Subscription(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(120), nullable=False)
-    description = db.Column(db.Text)
-    price = db.Column(db.Float, nullable=False, default=0.0)
-    sessions = db.Column(db.Integer, nullable=False, default=1)
-
-
-class Abonement(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False)
-    description = db.Column(db.Text)
-    price = db.Column(db.Float, nullable=False)
-
-class Booking(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    student_name = db.Column(db.String(100), nullable=False)
-    direction_id = db.Column(db.Integer, db.ForeignKey('direction.id'), nullable=False)
-    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
-    attended = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-
-    tablename = 'booking'
-    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
-    lesson = db.relationship('Lesson', back_populates='bookings')
-
-    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
-    student = db.relationship('Student', back_populates='bookings')
-
-
-class Payment(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey('student.id'))
-    student = db.relationship('Student', back_populates='payments')
-    amount = db.Column(db.Float, nullable=False)
-    note = db.Column(db.String(200))
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-
-
-def current_user():
-    uid = session.get('user_id')
-    if not uid:
-        return None
-    return User.query.get(uid)
-
-def login_user(user):
-    session['user_id'] = user.id
-
-def logout_user():
-    session.pop('user_id', None)
-
-def require_role(*roles):
-    user = current_user()
-    if not user or user.role not in roles:
-        abort(403)
+load_config(app)
+db.init_app(app)
+init_db_config(app)
+init_migrations(app)
+init_query_counter(app)
+init_identity(app)
+init_page_cache(app)
+init_profiling(app)
+jobs.init_jobs(app)
+init_assets(app)
+passwords.init_passwords(app)
+init_ratelimit(app)
+init_api(app)
+if app.config['TRUSTED_PROXIES']:
+    # за балансировщиком адрес клиента приходит в X-Forwarded-For
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+app.config.setdefault('WAITLIST_POLL_INTERVAL', 10)
+
 
 @app.route('/')
+@cached_page
 def index():
     directions = Direction.query.all()
-    teachers = Teacher.query.all()
-    upcoming = Lesson.query.filter(Lesson.start_dt >= datetime.now(timezone.utc)).order_by(Lesson.start_dt).limit(12).all()
-    return render_template('index.html', directions=directions, teachers=teachers, upcoming=upcoming, user=current_user())
+    teachers = Teacher.query.options(*TEACHER_CARD).all()
+    upcoming = lesson_page(limit=12).items
+    return render_template('index.html', directions=directions, teachers=teachers, upcoming=upcoming, user=current_identity())
 
 @app.route('/subscriptions')
+@cached_page
 def subscriptions():
-    return render_template('subscriptions.html', user=current_user())
+    return render_template('subscriptions.html', user=current_identity())
 @app.route('/login', methods=['GET','POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email'].strip().lower()
         pw = request.form['password']
+        limited = app.config['LOGIN_RATE_LIMIT']
+        if limited:
+            # до поиска пользователя и хэширования: отказ должен быть дешёвым
+            decision = login_limiter().check(ip=request.remote_addr, email=email)
+            if not decision.allowed:
+                retry_after = math.ceil(decision.retry_after)
+                flash(f'Слишком много попыток входа. Попробуйте через {retry_after} с.', 'danger')
+                response = make_response(render_template('login.html', user=current_identity()), 429)
+                response.headers['Retry-After'] = str(retry_after)
+                return response
         user = User.query.filter_by(email=email).first()
-        if not user or not user.check_password(pw):
+        if not user or not passwords.verify(user, pw):
             flash('Неверный email или пароль', 'danger')
             return redirect(url_for('login'))
+        db.session.commit()  # хэш мог быть пересчитан по новой политике
+        if limited:
+            login_limiter().reset(email=email)
         login_user(user)
         flash('Вход выполнен', 'success')
         return redirect(url_for('index'))
-    return render_template('login.html', user=current_user())
+    return render_template('login.html', user=current_identity())
 
-from werkzeug.security import generate_password_hash
-from flask import request, flash, redirect, url_for, render_template
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
-    u = current_user()
+    u = current_identity()
     if u:
         flash("Вы уже авторизованы.", "info")
         return redirect(url_for('index'))
@@ -186,7 +122,7 @@ def register():
             name=name,
             email=email,
             role='student',
-            password_hash=generate_password_hash(password)
+            password_hash=passwords.hash_password(password)
         )
         db.session.add(user)
         db.session.flush()
@@ -205,37 +141,59 @@ def logout():
     return redirect(url_for('index'))
 
 @app.route('/teachers')
+@cached_page
 def teachers():
-    ts = Teacher.query.all()
-    return render_template('teachers.html', teachers=ts, user=current_user())
+    ts = Teacher.query.options(*TEACHER_CARD).all()
+    return render_template('teachers.html', teachers=ts, user=current_identity())
 
 @app.route('/teacher/<int:tid>')
 def teacher_detail(tid):
-    t = Teacher.query.get_or_404(tid)
-    return render_template('teacher_detail.html', teacher=t, user=current_user())
+    t = Teacher.query.options(*TEACHER_CARD).filter_by(id=tid).first_or_404()
+    return render_template('teacher_detail.html', teacher=t, user=current_identity())
 
 @app.route('/directions')
+@cached_page
 def directions():
     ds = Direction.query.all()
-    return render_template('directions.html', directions=ds, user=current_user())
+    return render_template('directions.html', directions=ds, user=current_identity())
 
 @app.route('/groups')
 def groups():
-    gs = Group.query.all()
-    return render_template('groups.html', groups=gs, user=current_user())
+    gs = Group.query.options(*GROUP_ROW).all()
+    return render_template('groups.html', groups=gs, user=current_identity())
+
+def _schedule_page():
+    try:
+        filters = lesson_filters_from_args(request.args)
+    except ValueError:
+        abort(400)
+    return lesson_page(**filters)
 
 @app.route('/lessons')
 def lessons():
-    lessons = Lesson.query.order_by(Lesson.start_dt).all()
-    return render_template('lessons.html', lessons=lessons, user=current_user())
+    page = _schedule_page()
+    next_url = None
+    if page.next_cursor:
+        next_url = url_for('lessons', **{**request.args.to_dict(), 'cursor': page.next_cursor})
+    return render_template('lessons.html', lessons=page.items, next_url=next_url, user=current_identity())
+
+@app.route('/api/lessons')
+def api_lessons():
+    page = _schedule_page()
+    return jsonify(lessons=[lesson_to_dict(l) for l in page.items], next_cursor=page.next_cursor)
 
 @app.route('/lesson/<int:lid>')
 def lesson_detail(lid):
-    lesson = Lesson.query.get_or_404(lid)
-    taken = Booking.query.filter_by(lesson_id=lesson.id).count()
+    lesson = Lesson.query.options(*LESSON_DETAIL).filter_by(id=lid).first_or_404()
+    taken = lesson.seats_taken
     capacity = lesson.group.capacity
     spots_left = capacity - taken
-    return render_template('lesson_detail.html', lesson=lesson, spots_left=spots_left, taken=taken, user=current_user())
+    user = current_identity()
+    waitlist = None
+    if user and user.role == 'student':
+        waitlist = booking_service.waitlist_status(lid, booking_service.student_of_user(user.id))
+    return render_template('lesson_detail.html', lesson=lesson, spots_left=spots_left, taken=taken,
+                           waitlist=waitlist, user=user)
 
 @app.route('/book/<int:lid>', methods=['POST'])
 def book_lesson(lid):
@@ -244,45 +202,78 @@ def book_lesson(lid):
         flash("Только зарегистрированные студенты могут записываться.", "warning")
         return redirect(url_for('lesson_detail', lid=lid))
 
-    lesson = Lesson.query.get(lid)
+    lesson = Lesson.query.options(joinedload(Lesson.group)).filter_by(id=lid).first()
     if not lesson:
         flash("Урок не найден.", "danger")
         return redirect(url_for('lessons'))
 
-    student = Student.query.filter_by(user_id=user.id).first()
+    student = user.student
     if not student:
         flash("Студентская запись не найдена — обратитесь к администратору.", "danger")
         return redirect(url_for('lessons'))
 
-    taken = Booking.query.filter_by(lesson_id=lesson.id).count()
-    spots_left = (lesson.group.capacity or 0) - taken
-    if spots_left <= 0:
-        flash("К сожалению, мест на этот урок нет.", "warning")
-        return redirect(url_for('lesson_detail', lid=lid))
-
-    already = Booking.query.filter_by(lesson_id=lesson.id, student_id=student.id).first()
-    if already:
-        flash("Вы уже записаны на этот урок.", "info")
-        return redirect(url_for('lesson_detail', lid=lid))
-
     try:
-        booking = Booking(
-            student_name = user.name or student.user.name or "Студент",
-            direction_id = lesson.group.direction_id if lesson.group else None,
-            teacher_id = lesson.group.teacher_id if lesson.group else None,
-            lesson_id = lesson.id,
-            student_id = student.id,
-            attended = False
-        )
-        db.session.add(booking)
-        db.session.commit()
+        booking_service.book(lesson, student, user.name or "Студент")
         flash("Вы успешно записаны на урок.", "success")
-    except IntegrityError as e:
-        db.session.rollback()
+    except booking_service.LessonFull:
+        flash("К сожалению, мест на этот урок нет — можно встать в лист ожидания.", "warning")
+    except booking_service.AlreadyBooked:
+        flash("Вы уже записаны на этот урок.", "info")
+    except OperationalError:
         flash("Ошибка записи — проверьте данные или свяжитесь с администратором.", "danger")
 
     return redirect(url_for('lesson_detail', lid=lid))
 
+@app.route('/lesson/<int:lid>/waitlist', methods=['POST'])
+def join_waitlist(lid):
+    user = current_user()
+    if not user or user.role != 'student' or not user.student:
+        abort(403)
+    lesson = Lesson.query.options(joinedload(Lesson.group)).filter_by(id=lid).first_or_404()
+    try:
+        # место могло освободиться, пока страница была открыта
+        booking_service.book(lesson, user.student, user.name or "Студент")
+        flash("Место освободилось — вы записаны на урок.", "success")
+    except booking_service.AlreadyBooked:
+        flash("Вы уже записаны на этот урок.", "info")
+    except booking_service.LessonFull:
+        try:
+            position = booking_service.join_waitlist(lesson, user.student)
+            flash(f"Вы в листе ожидания, место в очереди: {position}.", "success")
+        except booking_service.AlreadyWaiting:
+            flash("Вы уже в листе ожидания.", "info")
+        except booking_service.AlreadyBooked:
+            flash("Вы уже записаны на этот урок.", "info")
+    return redirect(url_for('lesson_detail', lid=lid))
+
+@app.route('/lesson/<int:lid>/waitlist/leave', methods=['POST'])
+def leave_waitlist(lid):
+    user = current_user()
+    if not user or user.role != 'student' or not user.student:
+        abort(403)
+    if booking_service.leave_waitlist(lid, user.student.id):
+        flash("Вы вышли из листа ожидания.", "info")
+    return redirect(url_for('lesson_detail', lid=lid))
+
+@app.route('/api/lessons/<int:lid>/waitlist')
+def api_waitlist_status(lid):
+    """Статус записи/очереди; с ``If-None-Match`` — 304, если не изменился.
+
+    Ответ сразу, без удержания воркера: клиент повторяет запрос через
+    ``Retry-After`` секунд.
+    """
+    user = current_user()
+    if not user or user.role != 'student' or not user.student:
+        abort(403)
+    status = booking_service.waitlist_status(lid, user.student.id)
+    if status.spots_left is None:
+        abort(404)
+    response = jsonify(lesson_id=lid, **status._asdict())
+    response.set_etag(booking_service.waitlist_etag(status))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Retry-After'] = str(app.config['WAITLIST_POLL_INTERVAL'])
+    return response.make_conditional(request)
+
 @app.route('/booking/<int:bid>/cancel', methods=['POST'])
 def cancel_booking(bid):
     user = current_user()
@@ -291,11 +282,10 @@ def cancel_booking(bid):
     b = Booking.query.get_or_404(bid)
     if b.student.user_id != user.id:
         abort(403)
-    if b.lesson.start_dt < datetime.now(datetime.UTC):
+    if b.lesson.start_dt < datetime.now():
         flash('Нельзя отменить прошедшее занятие', 'warning')
         return redirect(url_for('student_profile'))
-    db.session.delete(b)
-    db.session.commit()
+    booking_service.cancel(b)
     flash('Запись отменена', 'info')
     return redirect(url_for('student_profile'))
 
@@ -305,13 +295,23 @@ def student_profile():
     if not user:
         abort(403)
     if user.role == 'student':
-        bookings = Booking.query.join(Lesson).filter(Booking.student_id==user.student.id).order_by(Lesson.start_dt).all()
-        payments = Payment.query.filter_by(student_id=user.student.id).order_by(Payment.created_at.desc()).all()
-        return render_template('student_profile.html', bookings=bookings, payments=payments, user=user)
+        student_id = user.student.id
+        try:
+            history = timeline.history(student_id, cursor=request.args.get('past'))
+            payments = timeline.payments(student_id, cursor=request.args.get('payments'))
+        except ValueError:
+            abort(400)
+        return render_template('student_profile.html', upcoming=timeline.upcoming(student_id), history=history,
+                               payments=payments, user=user)
     elif user.role == 'teacher':
         t = user.teacher
-        lessons = Lesson.query.join(Group).filter(Group.teacher_id==t.id).order_by(Lesson.start_dt).all()
-        return render_template('teacher_detail.html', teacher=t, lessons=lessons, user=user)
+        cursor = request.args.get('cursor')
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            abort(400)
+        page = lesson_page(teacher_id=t.id, after=after)
+        return render_template('teacher_detail.html', teacher=t, lessons=page.items, next_cursor=page.next_cursor, user=user)
     elif user.role == 'admin':
         return redirect(url_for('admin_dashboard'))
     else:
@@ -319,18 +319,22 @@ def student_profile():
 
 @app.route('/admin')
 def admin_dashboard():
-    require_role('admin')
-    stats = {
-        'students': Student.query.count(),
-        'teachers': Teacher.query.count(),
-        'directions': Direction.query.count(),
-        'upcoming_lessons': Lesson.query.filter(Lesson.start_dt >= datetime.now(timezone.utc)).count()
-    }
-    return render_template('admin_dashboard.html', stats=stats, user=current_user())
+    user = require_role('admin')
+    return render_template('admin_dashboard.html', stats=dashboard_stats(), user=user)
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    metrics = profiling_metrics()
+    if metrics is None:
+        abort(404)
+    token = app.config['PROFILING_METRICS_TOKEN']
+    if not token or request.headers.get('Authorization') != f'Bearer {token}':
+        require_role('admin')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/admin/add_direction', methods=['GET','POST'])
 def admin_add_direction():
-    require_role('admin')
+    user = require_role('admin')
     if request.method == 'POST':
         name = request.form['name'].strip()
         desc = request.form.get('description','').strip()
@@ -341,13 +345,13 @@ def admin_add_direction():
         db.session.commit()
         flash('Направление добавлено', 'success')
         return redirect(url_for('directions'))
-    return render_template('direction_form.html', user=current_user())
+    return render_template('direction_form.html', user=user)
 
 @app.route('/admin/add_group', methods=['GET','POST'])
 def admin_add_group():
-    require_role('admin')
+    user = require_role('admin')
     directions = Direction.query.all()
-    teachers = Teacher.query.all()
+    teachers = Teacher.query.options(*TEACHER_CARD).all()
     if request.method == 'POST':
         name = request.form['name'].strip()
         direction_id = int(request.form['direction_id'])
@@ -361,29 +365,83 @@ def admin_add_group():
         db.session.add(g); db.session.commit()
         flash('Группа создана', 'success')
         return redirect(url_for('groups'))
-    return render_template('group_form.html', directions=directions, teachers=teachers, user=current_user())
+    return render_template('group_form.html', directions=directions, teachers=teachers, user=user)
 
 @app.route('/admin/add_lesson', methods=['GET','POST'])
 def admin_add_lesson():
-    require_role('admin')
-    groups = Group.query.all()
+    user = require_role('admin')
+    groups = Group.query.options(*GROUP_ROW).all()
     if request.method == 'POST':
         group_id = int(request.form['group_id'])
         dt_str = request.form['start_dt'].strip()
-        duration = int(request.form.get('duration', '60'))
         try:
             start_dt = datetime.fromisoformat(dt_str)
+            duration = int(request.form.get('duration') or 60)
         except Exception:
-            flash('Неверный формат даты/времени', 'danger')
+            flash('Неверный формат даты/времени или длительности', 'danger')
             return redirect(url_for('admin_add_lesson'))
         if start_dt < datetime.now() - timedelta(minutes=30):
             flash('Нельзя создавать урок в прошлом', 'danger')
             return redirect(url_for('admin_add_lesson'))
+        try:
+            conflicts = scheduling.find_conflicts([scheduling.Slot(group_id, start_dt, duration)])
+        except scheduling.SchedulingError as e:
+            flash(f'Ошибка: {e}', 'danger')
+            return render_template('lesson_form.html', groups=groups, user=user, form=request.form)
+        if conflicts and not request.form.get('force'):
+            flash('Преподаватель или зал в это время уже заняты', 'danger')
+            return render_template('lesson_form.html', groups=groups, user=user, conflicts=conflicts,
+                                   form=request.form, **_conflict_labels(groups))
         lesson = Lesson(group_id=group_id, start_dt=start_dt, duration_minutes=duration)
         db.session.add(lesson); db.session.commit()
         flash('Урок добавлен', 'success')
         return redirect(url_for('lessons'))
-    return render_template('lesson_form.html', groups=groups, user=current_user())
+    return render_template('lesson_form.html', groups=groups, user=user, form={})
+
+def _conflict_labels(groups):
+    return {
+        'group_names': {g.id: g.name for g in groups},
+        'teacher_names': {g.teacher_id: g.teacher.user.name for g in groups if g.teacher and g.teacher.user},
+    }
+
+@app.route('/admin/schedule_series', methods=['GET', 'POST'])
+def admin_schedule_series():
+    user = require_role('admin')
+    groups = Group.query.options(*GROUP_ROW).all()
+    context = dict(groups=groups, user=user, weekdays=scheduling.WEEKDAYS, form=request.form,
+                   **_conflict_labels(groups))
+    if request.method == 'POST':
+        try:
+            slots = scheduling.expand_weekly(
+                int(request.form['group_id']),
+                date.fromisoformat(request.form['first_day']),
+                date.fromisoformat(request.form['until']),
+                [int(d) for d in request.form.getlist('weekdays')],
+                time.fromisoformat(request.form['time']),
+                int(request.form.get('duration') or 60),
+                scheduling.parse_holidays(request.form.get('holidays')),
+            )
+            if slots and slots[0].start_dt < datetime.now() - timedelta(minutes=30):
+                raise scheduling.SchedulingError('серия начинается в прошлом')
+            conflicts = scheduling.find_conflicts(slots)
+        except scheduling.SchedulingError as e:
+            flash(f'Ошибка: {e}', 'danger')
+            return render_template('schedule_series.html', **context)
+        except (KeyError, ValueError):
+            flash('Проверьте группу, даты, время и длительность', 'danger')
+            return render_template('schedule_series.html', **context)
+
+        on_conflict = request.form.get('on_conflict', 'stop')
+        if request.form.get('action') == 'create' and (not conflicts or on_conflict != 'stop'):
+            if on_conflict == 'skip':
+                slots = scheduling.without_conflicts(slots, conflicts)
+            created = scheduling.create_lessons(slots)
+            flash(f'Создано уроков: {created}', 'success')
+            return redirect(url_for('lessons'))
+        if request.form.get('action') == 'create':
+            flash(f'Накладок: {len(conflicts)} — уроки не созданы', 'warning')
+        return render_template('schedule_series.html', slots=slots, conflicts=conflicts, **context)
+    return render_template('schedule_series.html', **context)
 
 @app.route('/admin/add_student', methods=['GET', 'POST'])
 def admin_add_student():
@@ -398,7 +456,7 @@ def admin_add_student():
             name=name,
             email=email,
             role='student',
-            password_hash=generate_password_hash(password)
+            password_hash=passwords.hash_password(password)
         )
         db.session.add(user)
         db.session.flush()
@@ -412,10 +470,49 @@ def admin_add_student():
     groups = Group.query.all()
     return render_template('add_student.html', groups=groups)
 
+@app.route('/admin/import_students', methods=['GET', 'POST'])
+def admin_import_students():
+    user = require_role('admin')
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Выберите CSV-файл', 'danger')
+            return redirect(url_for('admin_import_students'))
+        try:
+            # без пула процессов внутри воркера gunicorn; большие файлы — flask import-students
+            report = import_students(io.TextIOWrapper(upload.stream, encoding='utf-8-sig'), workers=0)
+        except UnicodeDecodeError:
+            db.session.rollback()
+            flash('Файл не в кодировке UTF-8 — сохраните его как «CSV UTF-8»', 'danger')
+            return redirect(url_for('admin_import_students'))
+        flash(f'Импортировано студентов: {report.imported}', 'success' if not report.errors else 'warning')
+    return render_template('admin_import_students.html', report=report, user=user)
+
+@app.route('/admin/export/<kind>')
+def admin_export(kind):
+    """CSV-выгрузка потоком; ``?from=&to=&group_id=&teacher_id=``, ``?gzip=1`` — сжать."""
+    require_role('admin')
+    if kind not in exports.EXPORTS:
+        abort(404)
+    try:
+        filters = exports.parse_filters(request.args)
+    except exports.ExportError as e:
+        return jsonify(error=str(e)), 400
+    name = exports.filename(kind, filters)
+    chunks = exports.csv_chunks(kind, filters)
+    mimetype = 'text/csv; charset=utf-8'
+    if request.args.get('gzip') == '1':
+        chunks, name, mimetype = exports.gzip_chunks(chunks), name + '.gz', 'application/gzip'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
 @app.route('/abonements')
+@cached_page
 def abonements():
     abonements = Abonement.query.all()
-    return render_template('abonements.html', abonements=abonements, user=current_user())
+    return render_template('abonements.html', abonements=abonements, user=current_identity())
 
 @app.route('/admin/add_abonement', methods=['GET', 'POST'])
 def admin_add_abonement():
@@ -444,7 +541,7 @@ def admin_edit_abonement(aid):
 
 @app.route('/admin/attendance/<int:lesson_id>', methods=['GET','POST'])
 def mark_attendance(lesson_id):
-    lesson = Lesson.query.get_or_404(lesson_id)
+    lesson = Lesson.query.options(*LESSON_CARD).filter_by(id=lesson_id).first_or_404()
     user = current_user()
     if not user:
         abort(403)
@@ -453,23 +550,70 @@ def mark_attendance(lesson_id):
             abort(403)
     elif user.role != 'admin':
         abort(403)
-    bookings = Booking.query.filter_by(lesson_id=lesson.id).all()
     if request.method == 'POST':
-        present_ids = request.form.getlist('present')
-        for b in bookings:
-            b.attended = str(b.id) in present_ids
-        db.session.commit()
+        try:
+            present = attendance.parse_ids(request.form.getlist('present'))
+        except attendance.AttendanceError:
+            abort(400)
+        attendance.mark({lesson.id: present})
         flash('Посещаемость сохранена', 'success')
         return redirect(url_for('lesson_detail', lid=lesson.id))
+    bookings = Booking.query.options(*STUDENT_BOOKING_ROW).filter_by(lesson_id=lesson.id).all()
     return render_template('admin_students.html', lesson=lesson, bookings=bookings, user=user)
 
+@app.route('/api/attendance', methods=['POST'])
+def api_attendance():
+    user = current_user()
+    if not user:
+        abort(403)
+    try:
+        marks = attendance.parse_marks(request.get_json(silent=True) or {})
+    except attendance.AttendanceError as e:
+        return jsonify(error=str(e)), 400
+    if attendance.allowed_lessons(user, list(marks)) != set(marks):
+        abort(403)
+    return jsonify(lessons=attendance.mark(marks))
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def api_jobs():
+    """GET — последние задачи (``?status=failed``); POST ``{"kind", "payload"}`` c ``Idempotency-Key``."""
+    require_role('admin')
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        key = request.headers.get('Idempotency-Key')
+        try:
+            job = jobs.enqueue(data.get('kind'), data.get('payload') or {}, key=key)
+            db.session.commit()
+        except jobs.JobError as e:
+            db.session.rollback()
+            return jsonify(error=str(e)), 400
+        except IntegrityError:
+            # параллельный POST с тем же ключом успел раньше
+            db.session.rollback()
+            job = Job.query.filter_by(idempotency_key=key).first()
+            if key is None or job is None:
+                raise
+        response = jsonify(jobs.job_to_dict(job))
+        response.status_code = 202
+        response.headers['Location'] = url_for('api_job', job_id=job.id)
+        return response
+    q = Job.query.order_by(Job.id.desc())
+    if request.args.get('status'):
+        q = q.filter_by(status=request.args['status'])
+    return jsonify(jobs=[jobs.job_to_dict(j) for j in q.limit(50)])
+
+@app.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    require_role('admin')
+    return jsonify(jobs.job_to_dict(db.get_or_404(Job, job_id)))
+
 @app.route('/admin/students')
 def admin_students():
     user = current_user()
     if not user or user.role != 'admin':
         return redirect(url_for('login'))
 
-    students = Student.query.all()
+    students = Student.query.options(*ADMIN_STUDENT_ROW).all()
     return render_template('admin_students.html', students=students, user=user)
 
 @app.route('/admin/mark_attendance/<int:booking_id>', methods=['POST'])
@@ -481,9 +625,73 @@ def admin_mark_attendance(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     booking.attended = not booking.attended
     db.session.commit()
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(id=booking.id, attended=booking.attended)
     return redirect(url_for('admin_students'))
 
+@app.cli.command('recount-seats')
+def recount_seats_command():
+    """Пересчитать занятые места на уроках по таблице записей."""
+    booking_service.recount_seats()
+    print('✅ Счётчики мест пересчитаны.')
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Пересчитать статистику админ-панели по всей истории."""
+    rebuild_stats()
+    print('✅ Статистика пересчитана.')
+
+@app.cli.command('rebuild-timeline')
+def rebuild_timeline_command():
+    """Пересобрать сводку записей студентов (/me) по всем записям."""
+    timeline.rebuild()
+    print('✅ Сводка записей пересобрана.')
+
+@app.cli.command('import-students')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--workers', type=int, default=None, help='Процессов для хэширования паролей')
+def import_students_command(path, batch_size, workers):
+    """Импортировать студентов из CSV (name,email,password,phone,group_id)."""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        report = import_students(f, batch_size=batch_size, workers=workers)
+    for error in report.errors:
+        print(f'⚠️ строка {error.line} ({error.email}): {error.message}')
+    print(f'✅ {report.summary()}')
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(exports.EXPORTS)))
+@click.option('--from', 'date_from', help='YYYY-MM-DD')
+@click.option('--to', 'date_to', help='YYYY-MM-DD, включительно')
+@click.option('--group-id', type=int)
+@click.option('--teacher-id', type=int)
+@click.option('--gzip', 'compress', is_flag=True, help='Сжать в gzip')
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help='Файл (по умолчанию имя по фильтрам)')
+def export_command(kind, date_from, date_to, group_id, teacher_id, compress, output):
+    """Выгрузить записи, платежи или уроки в CSV."""
+    try:
+        filters = exports.parse_filters({'from': date_from, 'to': date_to,
+                                         'group_id': group_id, 'teacher_id': teacher_id})
+    except exports.ExportError as e:
+        raise click.BadParameter(str(e))
+    chunks = exports.csv_chunks(kind, filters)
+    if compress:
+        chunks = exports.gzip_chunks(chunks)
+    output = output or exports.filename(kind, filters) + ('.gz' if compress else '')
+    size = 0
+    with open(output, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+    print(f'✅ {output}: {size} байт')
+
+@app.cli.command('db-settings')
+def db_settings_command():
+    """Показать эффективные настройки подключения к БД."""
+    for name, value in effective_settings().items():
+        print(f'{name}: {value}')
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        upgrade()
     app.run(debug=True)
\ No newline at end of file
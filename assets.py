@@ -0,0 +1,266 @@
+"""Сборка статики: имена с хэшем содержимого, сжатие, WebP для фотографий.
+
+``flask build-assets`` раскладывает ``static/`` в ``static/dist/``:
+
+* каждый файл копируется под именем с хэшем (``style.3f9c1a2b7d4e.css``),
+  ссылки ``url(...)`` внутри CSS переписываются на такие же имена;
+* текстовые файлы рядом получают ``.gz`` и, если установлен ``brotli``,
+  ``.br`` — отдаются как есть по ``Accept-Encoding``;
+* для JPEG/PNG, если установлен Pillow, делаются WebP нужных ширин
+  (``WEBP_WIDTHS``) для ``srcset``;
+* итог записывается в ``static/dist/manifest.json``.
+
+Pillow и brotli есть в ``requirements.txt``; без них (например, в
+dev-окружении) сборка идёт с предупреждением. В Procfile сборка — шаг
+``release:``, а не запуск каждого веб-процесса.
+
+В шаблонах ``asset_url('style.css')`` даёт адрес из манифеста, а
+``asset_srcset('images/hero.jpg')`` — WebP-варианты. Файлы из ``dist/``
+отдаются с ``Cache-Control: immutable`` на год: новое содержимое — новое
+имя. Без сборки (манифеста нет) всё работает как раньше, по исходным путям.
+
+Старые файлы из ``dist/`` не удаляются, чтобы страницы из кэша не ссылались
+на пропавшую статику; ``--clean`` убирает всё, чего нет в манифесте.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+WEBP_WIDTHS = (320, 640, 960, 1280)
+WEBP_QUALITY = 80
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt')
+IMAGES = ('.jpg', '.jpeg', '.png')
+ONE_YEAR = 365 * 24 * 3600
+
+# порядок важен: br лучше сжимает
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def _hashed_name(path, data):
+    stem, ext = posixpath.splitext(path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _write(path, data):
+    if os.path.exists(path):
+        return  # имя зависит от содержимого — файл уже тот же
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _compress(out_dir, name, data):
+    encodings = []
+    variants = [('gzip', '.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ('br', '.br', brotli.compress(data, quality=11)))
+    for encoding, suffix, compressed in variants:
+        if len(compressed) < len(data):
+            _write(os.path.join(out_dir, name + suffix), compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def _webp_variants(out_dir, name, source):
+    variants = []
+    with Image.open(source) as image:
+        # ширина почти как у оригинала ничего не экономит
+        widths = [w for w in WEBP_WIDTHS if w < image.width * 0.9] + [image.width]
+        stem = posixpath.splitext(name)[0]
+        for width in widths:
+            variant = f'{stem}.{width}w.webp'
+            path = os.path.join(out_dir, variant)
+            if not os.path.exists(path):
+                height = round(image.height * width / image.width)
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                resized.save(path + '.tmp', 'WEBP', quality=WEBP_QUALITY, method=6)
+                os.replace(path + '.tmp', path)
+            variants.append([width, variant])
+    return variants
+
+
+def _rewrite_css(logical, text, manifest):
+    base = posixpath.dirname(logical)
+
+    def replace(match):
+        quote, target = match.groups()
+        if target.startswith('/static/'):
+            source = target[len('/static/'):]
+        elif '://' in target or target.startswith(('/', 'data:', '#')):
+            return match.group(0)
+        else:
+            source = posixpath.normpath(posixpath.join(base, target))
+        entry = manifest.get(source)
+        if entry is None:
+            return match.group(0)
+        return f'url({quote}{posixpath.relpath(entry["file"], base or ".")}{quote})'
+
+    return _CSS_URL.sub(replace, text)
+
+
+def build(static_folder, clean=False):
+    """Собирает ``static_folder`` в ``static_folder/dist``; возвращает манифест."""
+    out_dir = os.path.join(static_folder, DIST)
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder):
+            dirs[:] = [d for d in dirs if d != DIST]
+        for filename in files:
+            path = os.path.join(root, filename)
+            sources.append(os.path.relpath(path, static_folder).replace(os.sep, '/'))
+    # CSS в конце: к этому моменту известны новые имена картинок
+    sources.sort(key=lambda p: (p.endswith('.css'), p))
+
+    manifest = {}
+    for logical in sources:
+        source = os.path.join(static_folder, logical)
+        with open(source, 'rb') as f:
+            data = f.read()
+        if logical.endswith('.css'):
+            data = _rewrite_css(logical, data.decode('utf-8'), manifest).encode('utf-8')
+        name = _hashed_name(logical, data)
+        _write(os.path.join(out_dir, name), data)
+        entry = {'file': name, 'size': len(data)}
+        if logical.endswith(COMPRESSIBLE):
+            entry['encodings'] = _compress(out_dir, name, data)
+        if logical.lower().endswith(IMAGES) and Image is not None:
+            entry['webp'] = _webp_variants(out_dir, name, source)
+        manifest[logical] = entry
+
+    if clean:
+        keep = {MANIFEST}
+        for entry in manifest.values():
+            keep.add(entry['file'])
+            keep.update(entry['file'] + suffix for _, suffix in ENCODINGS)
+            keep.update(variant for _, variant in entry.get('webp', ()))
+        for root, _, files in os.walk(out_dir):
+            for filename in files:
+                rel = os.path.relpath(os.path.join(root, filename), out_dir).replace(os.sep, '/')
+                if rel not in keep:
+                    os.remove(os.path.join(root, filename))
+
+    tmp = os.path.join(out_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def manifest():
+    return current_app.extensions['assets']
+
+
+def image_path(photo):
+    """Путь в ``static/`` для ``Direction.photo``: ``krump.jpg``, ``images/krump.jpg`` или URL."""
+    if not photo:
+        return None
+    photo = photo.strip()
+    if '://' in photo or photo.startswith('//'):
+        return photo
+    photo = photo.lstrip('/')
+    if photo.startswith('static/'):
+        photo = photo[len('static/'):]
+    return photo if '/' in photo else f'images/{photo}'
+
+
+def asset_url(filename):
+    """URL статики: собранный файл с хэшем или, без сборки, исходный."""
+    if '://' in filename or filename.startswith('//'):
+        return filename
+    entry = manifest().get(filename)
+    if entry is None:
+        return url_for('static', filename=filename)
+    return url_for('static', filename=f'{DIST}/{entry["file"]}')
+
+
+def asset_srcset(filename):
+    """``srcset`` из WebP-вариантов картинки или пустая строка."""
+    entry = manifest().get(filename)
+    if not entry or not entry.get('webp'):
+        return ''
+    return ', '.join(f'{url_for("static", filename=f"{DIST}/{name}")} {width}w' for width, name in entry['webp'])
+
+
+def _encodings_for(filename):
+    """Готовые сжатые варианты файла из ``dist/``, если он есть в манифесте."""
+    name = filename[len(DIST) + 1:]
+    for entry in manifest().values():
+        if entry['file'] == name:
+            return entry.get('encodings', ())
+    return ()
+
+
+def init_assets(app):
+    app.extensions['assets'] = load_manifest(app.static_folder)
+    app.jinja_env.globals.update(asset_url=asset_url, asset_srcset=asset_srcset)
+    app.jinja_env.filters['image_path'] = image_path
+    serve_static = app.view_functions['static']
+
+    def static(filename):
+        if not filename.startswith(DIST + '/'):
+            return serve_static(filename=filename)
+        encodings = _encodings_for(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        accepted = request.accept_encodings
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings and accepted[encoding]:
+                response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype,
+                                               max_age=ONE_YEAR)
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(app.static_folder, filename, max_age=ONE_YEAR)
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
+
+    @app.cli.command('build-assets')
+    @click.option('--clean', is_flag=True, help='Удалить из dist/ файлы, которых нет в манифесте')
+    def build_assets_command(clean):
+        """Собрать статику в static/dist (хэши, gzip/brotli, WebP)."""
+        built = build(app.static_folder, clean=clean)
+        app.extensions['assets'] = built
+        total = sum(e['size'] for e in built.values())
+        webp = sum(len(e.get('webp', ())) for e in built.values())
+        if brotli is None:
+            print('⚠️ brotli не установлен — только gzip')
+        if Image is None:
+            print('⚠️ Pillow не установлен — без WebP-вариантов')
+        print(f'✅ {len(built)} файлов ({total} байт), WebP-вариантов: {webp}')
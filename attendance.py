@@ -0,0 +1,95 @@
+"""Пакетная отметка посещаемости.
+
+Отметки по одному или нескольким урокам применяются двумя UPDATE
+(присутствовали / отсутствовали) в одной транзакции вместо перебора
+записей в Python. Статистика (``stats``) сдвигается на разницу числа
+присутствовавших по каждому уроку, сводка для /me (``timeline``)
+пересобирается по этим урокам.
+"""
+from sqlalchemy import and_, case, false, func, or_, select, update
+
+import stats
+import timeline
+from models import db, Booking, Group, Lesson
+
+
+class AttendanceError(Exception):
+    pass
+
+
+def allowed_lessons(user, lesson_ids):
+    """Подмножество ``lesson_ids``, которые ``user`` может отмечать."""
+    q = select(Lesson.id).where(Lesson.id.in_(lesson_ids))
+    if user.role == 'teacher':
+        if not user.teacher:
+            return set()
+        q = q.join(Group, Group.id == Lesson.group_id).where(Group.teacher_id == user.teacher.id)
+    elif user.role != 'admin':
+        return set()
+    return set(db.session.scalars(q))
+
+
+def _present_counts(lesson_ids):
+    present = func.sum(case((Booking.attended, 1), else_=0))
+    rows = db.session.execute(
+        select(Booking.lesson_id, present, func.count(Booking.id))
+        .where(Booking.lesson_id.in_(lesson_ids))
+        .group_by(Booking.lesson_id)
+    ).all()
+    return {lesson_id: (present or 0, total) for lesson_id, present, total in rows}
+
+
+def mark(marks):
+    """Применяет ``{lesson_id: [id присутствовавших записей]}``.
+
+    Записи уроков, не попавшие в список, считаются пропуском; id записи
+    другого урока игнорируется. Возвращает ``{lesson_id: {'present': n, 'absent': m}}``.
+    """
+    lesson_ids = list(marks)
+    if not lesson_ids:
+        return {}
+    before = _present_counts(lesson_ids)
+
+    in_lessons = Booking.lesson_id.in_(lesson_ids)
+    present = or_(false(), *(
+        and_(Booking.lesson_id == lesson_id, Booking.id.in_(ids)) for lesson_id, ids in marks.items() if ids
+    ))
+    db.session.execute(
+        update(Booking).where(in_lessons, present).values(attended=True)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(Booking).where(in_lessons, ~present).values(attended=False)
+        .execution_options(synchronize_session=False)
+    )
+
+    after = _present_counts(lesson_ids)
+    connection = db.session.connection()
+    for lesson_id, (count, _) in after.items():
+        delta = count - before.get(lesson_id, (0, 0))[0]
+        if delta:
+            stats.apply_attendance(connection, lesson_id, delta)
+    timeline.refresh(connection, lesson_ids=lesson_ids)
+    db.session.commit()
+    db.session.expire_all()
+    return {
+        lesson_id: {'present': count, 'absent': total - count}
+        for lesson_id, (count, total) in after.items()
+    }
+
+
+def parse_ids(values):
+    """id записей из формы (``request.form.getlist('present')``)."""
+    try:
+        return [int(v) for v in values]
+    except (TypeError, ValueError) as e:
+        raise AttendanceError('ожидаются числовые id записей') from e
+
+
+def parse_marks(payload):
+    """Разбирает JSON ``{"lessons": [{"lesson_id": 1, "present": [..]}]}``."""
+    try:
+        items = payload['lessons']
+        return {int(item['lesson_id']): [int(b) for b in item.get('present', [])] for item in items}
+    except (KeyError, TypeError, ValueError) as e:
+        raise AttendanceError('ожидается {"lessons": [{"lesson_id": id, "present": [booking ids]}]}') from e
@@ -0,0 +1,152 @@
+"""Вес страниц ``/`` и ``/directions`` до и после сборки статики.
+
+Запуск из корня репозитория (нужна собранная статика и БД с направлениями)::
+
+    python -m bench.datagen --db /tmp/studio-bench.db
+    flask --app app build-assets
+    python -m bench.bench_assets --db /tmp/studio-bench.db
+
+Страница запрашивается тест-клиентом, из HTML и CSS собираются ресурсы
+(стили, ``<img>``/``<picture>`` c ``srcset``/``sizes``, ``url(...)``), из
+``srcset`` выбирается вариант, как это сделал бы браузер с заданной шириной
+окна и плотностью пикселей. Внешние ресурсы (Bootstrap с CDN) не считаются.
+«Без сборки» — те же шаблоны с пустым манифестом, то есть исходные файлы
+из ``static/``. Повторный визит: ресурсы без ``immutable`` браузер
+перепроверяет условным запросом.
+
+Синтетическая БД (8 направлений, 4 разных фото), Pillow + brotli::
+
+    /directions  mobile   без сборки  5 запросов    326.0 KiB  повторно: 5 проверок
+    /directions  mobile   со сборкой  5 запросов     61.4 KiB  повторно: 0 проверок
+    /directions  desktop  без сборки  5 запросов    326.0 KiB  повторно: 5 проверок
+    /directions  desktop  со сборкой  5 запросов     35.2 KiB  повторно: 0 проверок
+    /            mobile   без сборки  2 запросов    105.2 KiB  повторно: 2 проверок
+    /            mobile   со сборкой  2 запросов     56.1 KiB  повторно: 0 проверок
+    /            desktop  без сборки  2 запросов    105.2 KiB  повторно: 2 проверок
+    /            desktop  со сборкой  2 запросов     56.1 KiB  повторно: 0 проверок
+"""
+import argparse
+import gzip
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ширина окна, плотность пикселей
+PROFILES = {'mobile': (375, 2), 'desktop': (1440, 1)}
+PAGES = ('/directions', '/')
+
+_CSS_URL = re.compile(r'''url\(\s*['"]?([^'")]+)['"]?\s*\)''')
+_MEDIA = re.compile(r'\(\s*max-width\s*:\s*(\d+)px\s*\)\s*(.+)')
+
+
+def slot_width(sizes, viewport):
+    """Ширина слота по атрибуту ``sizes`` (поддерживаются max-width, px и vw)."""
+    for item in (sizes or '100vw').split(','):
+        item = item.strip()
+        match = _MEDIA.match(item)
+        if match:
+            if viewport > int(match.group(1)):
+                continue
+            item = match.group(2).strip()
+        if item.endswith('vw'):
+            return viewport * float(item[:-2]) / 100
+        return float(item.rstrip('px'))
+    return viewport
+
+
+def pick(srcset, sizes, viewport, dpr):
+    """Кандидат из ``srcset`` с дескрипторами ``w``, как выбрал бы браузер."""
+    candidates = []
+    for item in srcset.split(','):
+        url, width = item.split()
+        candidates.append((int(width.rstrip('w')), url))
+    candidates.sort()
+    needed = slot_width(sizes, viewport) * dpr
+    for width, url in candidates:
+        if width >= needed:
+            return url
+    return candidates[-1][1]
+
+
+class Resources(HTMLParser):
+    def __init__(self, viewport, dpr):
+        super().__init__()
+        self.viewport, self.dpr = viewport, dpr
+        self.urls = []
+        self._webp = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'link' and attrs.get('rel') == 'stylesheet':
+            self.urls.append(attrs['href'])
+        elif tag == 'picture':
+            self._webp = None
+        elif tag == 'source' and attrs.get('type') == 'image/webp':
+            self._webp = attrs
+        elif tag == 'img':
+            chosen = self._webp or attrs
+            if chosen.get('srcset'):
+                self.urls.append(pick(chosen['srcset'], chosen.get('sizes'), self.viewport, self.dpr))
+            else:
+                self.urls.append(attrs['src'])
+            self._webp = None
+        if 'style' in attrs:
+            self.urls.extend(_CSS_URL.findall(attrs['style']))
+
+
+def page_weight(client, path, viewport, dpr):
+    """(число запросов статики, байт при первом визите, перепроверок при повторном)."""
+    parser = Resources(viewport, dpr)
+    parser.feed(client.get(path).get_data(as_text=True))
+    urls, seen = list(parser.urls), set()
+    total, revalidate = 0, 0
+    while urls:
+        url = urls.pop(0)
+        if url in seen or not url.startswith('/'):
+            continue
+        seen.add(url)
+        response = client.get(url, headers={'Accept-Encoding': 'br, gzip' if brotli else 'gzip'})
+        total += len(response.data)
+        if 'immutable' not in (response.headers.get('Cache-Control') or ''):
+            revalidate += 1
+        if response.mimetype == 'text/css':
+            css = response.data
+            if response.content_encoding == 'br':
+                css = brotli.decompress(css)
+            elif response.content_encoding == 'gzip':
+                css = gzip.decompress(css)
+            urls.extend(urljoin(url, u) for u in _CSS_URL.findall(css.decode('utf-8')))
+    return len(seen), total, revalidate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help='БД с направлениями (bench.datagen)')
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+    from app import app
+
+    app.config['PAGE_CACHE_ENABLED'] = False
+    built = app.extensions['assets']
+    if not built:
+        raise SystemExit('⚠️ Статика не собрана — сначала flask --app app build-assets')
+    client = app.test_client()
+    for path in PAGES:
+        for profile, (viewport, dpr) in PROFILES.items():
+            for label, manifest in (('без сборки', {}), ('со сборкой', built)):
+                app.extensions['assets'] = manifest
+                requests, total, revalidate = page_weight(client, path, viewport, dpr)
+                print(f'{path:<12} {profile:<8} {label:<11} {requests} запросов  {total / 1024:7.1f} KiB  '
+                      f'повторно: {revalidate} проверок')
+    app.extensions['assets'] = built
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Пропускная способность ``/`` с identity из claims сессии и из БД.
+
+Запуск из корня репозитория::
+
+    python -m bench.bench_identity --requests 2000
+
+Прогоняет ``/`` тест-клиентом Flask для анонимного и залогиненного
+пользователя в двух режимах: ``IDENTITY_SESSION_CLAIMS=False`` (как раньше —
+пользователь читается из БД) и ``True`` (имя и роль из подписанной cookie).
+Заодно проверяется сессия, выданная до появления claims (только
+``user_id``): все ответы должны быть 200, иначе код возврата ненулевой.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from werkzeug.security import generate_password_hash
+
+
+def measure(client, n):
+    check(client)
+    started = time.perf_counter()
+    for _ in range(n):
+        client.get('/')
+    return n / (time.perf_counter() - started)
+
+
+def check(client, paths=('/', '/directions', '/teachers')):
+    for path in paths:
+        status = client.get(path).status_code
+        if status != 200:
+            raise SystemExit(f'⚠️ {path}: {status}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tmp, "bench.db")}'
+        from app import app
+        from models import db, User
+
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='s@bench', name='S', role='student',
+                                password_hash=generate_password_hash('pw', method='pbkdf2:sha256:1')))
+            db.session.commit()
+
+        for claims in (False, True):
+            app.config['IDENTITY_SESSION_CLAIMS'] = claims
+            anonymous = app.test_client()
+            logged_in = app.test_client()
+            logged_in.post('/login', data={'email': 's@bench', 'password': 'pw'})
+            mode = 'session claims' if claims else 'database'
+            print(f'{mode:>14}: anonymous {measure(anonymous, args.requests):7.0f} req/s, '
+                  f'logged in {measure(logged_in, args.requests):7.0f} req/s')
+            # сессия до деплоя claims: есть user_id, identity нет
+            with logged_in.session_transaction() as session:
+                session.pop('identity')
+            check(logged_in)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Вход и запись на урок, пока ``/login`` перебирают пароли.
+
+Запуск из корня репозитория (БД готовит ``bench.datagen``)::
+
+    python -m bench.datagen --db /tmp/studio-bench.db
+    python -m bench.bench_login --db /tmp/studio-bench.db --seconds 10
+
+Сначала меряется скорость успешного входа при разных ``PASSWORD_HASH_METHOD``
+(хэши пересчитываются при входе, так что каждый метод проверяется на своём
+хэше). Затем ``--attackers`` потоков шлют неверные пароли по случайным email
+с ``--attack-ips`` адресов, всего ``--attack-rate`` попыток в секунду, а
+студент в это время записывается на урок и отменяет запись и раз в секунду
+входит заново со своего адреса. Прогон делается без атаки, под атакой без
+ограничителя и с ним (``RATELIMIT_STORE=sqlite``, общий файл, как у
+нескольких воркеров gunicorn).
+
+Синтетическая БД, 1 CPU, 4 потока с одного адреса, 50 попыток/с, 10 с::
+
+    scrypt:32768:8:1            7 входов/с
+    pbkdf2:sha256:600000        3 входов/с
+    pbkdf2:sha256:100000       19 входов/с
+    без атаки         атака    0 попыток/с (хэшей  0/с, 429: 0)  запись p50  8.8ms p95 10.2ms  вход p50  150ms
+    без ограничителя  атака    6 попыток/с (хэшей  6/с, 429: 0)  запись p50 63.5ms p95 82.2ms  вход p50  686ms
+    с ограничителем   атака   50 попыток/с (хэшей  2/с, 429: 482)  запись p50  9.8ms p95 46.8ms  вход p50  156ms
+
+Без ограничителя атака упирается в CPU (успевает лишь 6 хэшей в секунду из
+50), и запись на урок замедляется в 7 раз; с ним лишние попытки получают 429
+без хэширования.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from bench.datagen import PASSWORD
+from bench.stress_booking import percentile
+
+
+METHODS = ('scrypt:32768:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000')
+
+
+def login_rate(app, email, method, n=10):
+    app.config['PASSWORD_HASH_METHOD'] = method
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': PASSWORD})  # пересчитать хэш
+    started = time.perf_counter()
+    for _ in range(n):
+        client.post('/login', data={'email': email, 'password': PASSWORD})
+    return n / (time.perf_counter() - started)
+
+
+def attacker(app, ip, emails, stop, counts, seed, rate):
+    """Шлёт ``rate`` попыток в секунду; не успевает — шлёт без пауз."""
+    rnd = random.Random(seed)
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = ip
+    next_at = time.perf_counter()
+    while not stop.is_set():
+        status = client.post('/login', data={'email': rnd.choice(emails), 'password': 'wrong'}).status_code
+        counts['limited' if status == 429 else 'hashed'] += 1
+        next_at += 1 / rate
+        stop.wait(max(0.0, next_at - time.perf_counter()))
+
+
+def student(app, email, student_id, lessons, stop, samples, logins):
+    from models import db, Booking
+
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = '192.0.2.1'
+    client.post('/login', data={'email': email, 'password': PASSWORD})
+    last_login = time.perf_counter()
+    rnd = random.Random(0)
+    while not stop.is_set():
+        lesson_id = rnd.choice(lessons)
+        started = time.perf_counter()
+        client.post(f'/book/{lesson_id}')
+        samples.append(time.perf_counter() - started)
+        with app.app_context():
+            booking_id = db.session.scalar(
+                db.select(Booking.id).where(Booking.lesson_id == lesson_id, Booking.student_id == student_id)
+            )
+        if booking_id:
+            client.post(f'/booking/{booking_id}/cancel')
+        with client.session_transaction() as session:
+            session.pop('_flashes', None)
+        if time.perf_counter() - last_login >= 1:
+            started = time.perf_counter()
+            client.post('/login', data={'email': email, 'password': PASSWORD})
+            last_login = time.perf_counter()
+            logins.append(last_login - started)
+
+
+def under_attack(app, args, emails, email, student_id, lessons, attackers):
+    stop = threading.Event()
+    counts = {'hashed': 0, 'limited': 0}
+    samples, logins = [], []
+    threads = [threading.Thread(target=attacker, args=(app, f'203.0.113.{i % args.attack_ips}', emails,
+                                                       stop, counts, i, args.attack_rate / attackers))
+               for i in range(attackers)]
+    threads.append(threading.Thread(target=student, args=(app, email, student_id, lessons, stop, samples, logins)))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts, samples, logins
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help='БД, подготовленная bench.datagen')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--attackers', type=int, default=4)
+    parser.add_argument('--attack-ips', type=int, default=1)
+    parser.add_argument('--attack-rate', type=float, default=50, help='попыток в секунду от всех потоков')
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+    from app import app
+    from models import db, Lesson, Student, User
+    from ratelimit import init_ratelimit
+
+    app.config['PAGE_CACHE_ENABLED'] = False
+    with app.app_context():
+        rows = db.session.execute(
+            db.select(Student.id, User.email).join(User, User.id == Student.user_id)
+            .where(User.email.like('student%@bench.local')).order_by(Student.id).limit(200)
+        ).all()
+        lessons = db.session.scalars(
+            db.select(Lesson.id).where(Lesson.start_dt >= datetime.now()).order_by(Lesson.start_dt).limit(200)
+        ).all()
+    (student_id, email), emails = rows[0], [e for _, e in rows[2:]]
+
+    app.config['LOGIN_RATE_LIMIT'] = False
+    for method in METHODS:
+        print(f'{method:<24} {login_rate(app, rows[1][1], method):4.0f} входов/с')
+    app.config['PASSWORD_HASH_METHOD'] = METHODS[0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config['RATELIMIT_STORE'] = 'sqlite'
+        app.config['RATELIMIT_DB'] = os.path.join(tmp, 'ratelimit.db')
+        init_ratelimit(app)
+        for label, attackers, limited in (('без атаки', 0, False), ('без ограничителя', args.attackers, False),
+                                          ('с ограничителем', args.attackers, True)):
+            app.config['LOGIN_RATE_LIMIT'] = limited
+            counts, samples, logins = under_attack(app, args, emails, email, student_id, lessons, attackers)
+            attempts = counts['hashed'] + counts['limited']
+            print(f'{label:<16}  атака {attempts / args.seconds:4.0f} попыток/с '
+                  f'(хэшей {counts["hashed"] / args.seconds:2.0f}/с, 429: {counts["limited"]})  '
+                  f'запись p50 {percentile(samples, 50) * 1000:4.1f}ms p95 {percentile(samples, 95) * 1000:4.1f}ms  '
+                  f'вход p50 {percentile(logins, 50) * 1000:4.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Генератор синтетической студии заданного масштаба.
+
+Запуск из корня репозитория::
+
+    python -m bench.datagen --db /tmp/studio-bench.db --students 50000 --bookings 200000 --years 5
+
+Схема создаётся миграциями (как в проде), данные вставляются пачками через
+executemany. У всех пользователей пароль ``bench``: администратор
+``admin@bench.local``, студенты ``student<N>@bench.local``, преподаватели
+``teacher<N>@bench.local``. В конце пересчитываются статистика и сводка
+записей для /me.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+
+PASSWORD = 'bench'
+CHUNK = 5000
+
+DIRECTIONS = ('Hip-hop', 'Krump', 'Vogue', 'Contemporary', 'Jazz-funk', 'House', 'Waacking', 'Breaking')
+LOCATIONS = ('Зал 1', 'Зал 2', 'Зал 3', 'Большой зал')
+PHOTOS = ('hiphop.jpg', 'krump.jpg', 'vogue.jpg', 'contemporary.jpg')
+
+
+def _chunks(rows, size=CHUNK):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _insert(db, table, rows):
+    for chunk in _chunks(rows):
+        db.session.execute(table.insert(), chunk)
+
+
+def generate(db, students=1000, bookings=5000, years=1, groups=12, teachers=6,
+             directions=4, lessons_per_week=2, payments_per_student=2, seed=42, now=None):
+    """Заполняет пустую БД. Возвращает словарь с количеством строк по таблицам."""
+    from models import Booking, Direction, Group, Lesson, Payment, Student, Teacher, User
+    import stats
+    import timeline
+
+    rnd = random.Random(seed)
+    now = now or datetime.now().replace(minute=0, second=0, microsecond=0)
+    password_hash = generate_password_hash(PASSWORD)
+
+    _insert(db, User.__table__, [
+        {'id': 1, 'email': 'admin@bench.local', 'name': 'Администратор', 'role': 'admin', 'password_hash': password_hash}
+    ] + [
+        {'id': 2 + i, 'email': f'teacher{i}@bench.local', 'name': f'Преподаватель {i}', 'role': 'teacher',
+         'password_hash': password_hash}
+        for i in range(teachers)
+    ])
+    _insert(db, Teacher.__table__, [
+        {'id': 1 + i, 'user_id': 2 + i, 'bio': 'Синтетический преподаватель', 'stage_name': f'T{i}'}
+        for i in range(teachers)
+    ])
+    _insert(db, Direction.__table__, [
+        {'id': 1 + i, 'name': DIRECTIONS[i % len(DIRECTIONS)], 'description': 'Синтетическое направление',
+         'photo': PHOTOS[i % len(PHOTOS)]}
+        for i in range(directions)
+    ])
+    capacities = {}
+    group_rows = []
+    for i in range(groups):
+        capacities[1 + i] = rnd.choice((10, 12, 15, 20))
+        group_rows.append({
+            'id': 1 + i, 'name': f'Группа {i}', 'direction_id': 1 + i % directions,
+            'teacher_id': 1 + i % teachers, 'capacity': capacities[1 + i],
+            'location': LOCATIONS[i % len(LOCATIONS)],
+        })
+    _insert(db, Group.__table__, group_rows)
+
+    # Уроки: lessons_per_week занятий в неделю на группу, years лет назад и 8 недель вперёд
+    start = now - timedelta(days=365 * years)
+    weeks = (now - start).days // 7 + 8
+    lesson_rows = []
+    for group_id in capacities:
+        slot_hour = 10 + (group_id * 2) % 11
+        for week in range(weeks):
+            for n in range(lessons_per_week):
+                day = start + timedelta(weeks=week, days=(group_id + n * 3) % 7)
+                lesson_rows.append({
+                    'id': len(lesson_rows) + 1, 'group_id': group_id,
+                    'start_dt': day.replace(hour=slot_hour), 'duration_minutes': 60, 'seats_taken': 0,
+                })
+
+    base_user = 2 + teachers
+    _insert(db, User.__table__, [
+        {'id': base_user + i, 'email': f'student{i}@bench.local', 'name': f'Студент {i}', 'role': 'student',
+         'password_hash': password_hash}
+        for i in range(students)
+    ])
+    _insert(db, Student.__table__, [
+        {'id': 1 + i, 'user_id': base_user + i, 'phone': f'+7900{i:07d}',
+         'group_id': rnd.randint(1, groups)}
+        for i in range(students)
+    ])
+
+    # Записи: уникальные пары (урок, студент) без превышения вместимости
+    seats = [0] * (len(lesson_rows) + 1)
+    pairs = set()
+    booking_rows = []
+    attempts = 0
+    while len(booking_rows) < bookings and attempts < bookings * 5:
+        attempts += 1
+        lesson = lesson_rows[rnd.randrange(len(lesson_rows))]
+        lesson_id = lesson['id']
+        if seats[lesson_id] >= capacities[lesson['group_id']]:
+            continue
+        student_id = rnd.randint(1, students)
+        if (lesson_id, student_id) in pairs:
+            continue
+        pairs.add((lesson_id, student_id))
+        seats[lesson_id] += 1
+        group = group_rows[lesson['group_id'] - 1]
+        past = lesson['start_dt'] < now
+        booking_rows.append({
+            'student_name': f'Студент {student_id - 1}', 'direction_id': group['direction_id'],
+            'teacher_id': group['teacher_id'], 'lesson_id': lesson_id, 'student_id': student_id,
+            'attended': past and rnd.random() < 0.8,
+            'created_at': lesson['start_dt'] - timedelta(days=rnd.randint(0, 14)),
+        })
+    for lesson in lesson_rows:
+        lesson['seats_taken'] = seats[lesson['id']]
+    _insert(db, Lesson.__table__, lesson_rows)
+    _insert(db, Booking.__table__, booking_rows)
+
+    payment_rows = [
+        {'student_id': rnd.randint(1, students), 'amount': rnd.choice((1500.0, 4500.0, 8000.0)),
+         'note': 'Абонемент', 'created_at': start + timedelta(seconds=rnd.randint(0, int((now - start).total_seconds())))}
+        for _ in range(students * payments_per_student)
+    ]
+    _insert(db, Payment.__table__, payment_rows)
+    db.session.commit()
+    stats.rebuild()
+    timeline.rebuild()
+    return {
+        'users': 1 + teachers + students, 'teachers': teachers, 'directions': directions, 'groups': groups,
+        'lessons': len(lesson_rows), 'students': students, 'bookings': len(booking_rows),
+        'payments': len(payment_rows),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help='путь к файлу SQLite (будет пересоздан)')
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--bookings', type=int, default=200000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--groups', type=int, default=40)
+    parser.add_argument('--teachers', type=int, default=15)
+    parser.add_argument('--directions', type=int, default=6)
+    parser.add_argument('--lessons-per-week', type=int, default=2)
+    parser.add_argument('--payments-per-student', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    path = os.path.abspath(args.db)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    from flask_migrate import upgrade
+    from app import app
+    from models import db
+
+    started = time.perf_counter()
+    with app.app_context():
+        upgrade()
+        counts = generate(
+            db, students=args.students, bookings=args.bookings, years=args.years, groups=args.groups,
+            teachers=args.teachers, directions=args.directions, lessons_per_week=args.lessons_per_week,
+            payments_per_student=args.payments_per_student, seed=args.seed,
+        )
+    print(', '.join(f'{k}={v}' for k, v in counts.items()))
+    print(f'{path} generated in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
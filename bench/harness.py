@@ -0,0 +1,233 @@
+"""Нагрузочный прогон основных маршрутов на синтетической БД.
+
+Запуск из корня репозитория (БД готовит ``bench.datagen``)::
+
+    python -m bench.datagen --db /tmp/studio-bench.db
+    python -m bench.harness --db /tmp/studio-bench.db --requests 2000 --save bench/baseline.json
+    python -m bench.harness --db /tmp/studio-bench.db --requests 2000 --compare bench/baseline.json
+
+Запросы идут через тест-клиент Flask по взвешенной смеси сценариев (``MIXES``):
+просмотр расписания, карточка урока, запись и отмена, личный кабинет, админка.
+Для каждого маршрута печатаются число запросов, ошибки, req/s, p50/p95/p99 и
+среднее число SQL-запросов. ``--save`` пишет результат в JSON, ``--compare``
+сравнивает с сохранённым базовым прогоном и завершается с ненулевым кодом,
+если p95 или число SQL выросли больше ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from bench.datagen import PASSWORD
+from bench.stress_booking import percentile
+
+
+# сценарий -> вес
+MIXES = {
+    'browse': {'lessons': 40, 'lesson_detail': 15, 'api_lessons': 10, 'index': 10, 'me': 15, 'book': 5, 'cancel': 5},
+    'student': {'lessons': 20, 'lesson_detail': 10, 'me': 30, 'book': 20, 'cancel': 20},
+    'admin': {'admin_dashboard': 30, 'admin_students': 20, 'lessons': 30, 'lesson_detail': 20},
+    'mixed': {'lessons': 30, 'lesson_detail': 10, 'api_lessons': 5, 'index': 5, 'me': 20, 'book': 10,
+              'cancel': 10, 'admin_dashboard': 5, 'admin_students': 5},
+}
+
+
+class Harness:
+    def __init__(self, app, students=20, seed=1):
+        from models import db, Lesson, Student, User
+
+        self.app = app
+        self.rnd = random.Random(seed)
+        self.samples = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.my_bookings = defaultdict(list)
+
+        with app.app_context():
+            self.upcoming = [lid for lid, in db.session.execute(
+                db.select(Lesson.id).where(Lesson.start_dt >= datetime.now()).order_by(Lesson.start_dt).limit(500)
+            )]
+            rows = db.session.execute(
+                db.select(Student.id, User.email).join(User, User.id == Student.user_id)
+                .where(User.email.like('student%@bench.local')).limit(students)
+            ).all()
+        if not self.upcoming or not rows:
+            raise SystemExit('⚠️ В БД нет будущих уроков или студентов — сначала запустите bench.datagen')
+
+        self.admin = self._login('admin@bench.local')
+        self.students = [(student_id, self._login(email)) for student_id, email in rows]
+
+    def _login(self, email):
+        client = self.app.test_client()
+        client.post('/login', data={'email': email, 'password': PASSWORD})
+        client.get('/')  # забрать flash, чтобы он не влиял на кэш страниц
+        return client
+
+    def _request(self, route, client, method, url):
+        from queries import count_queries
+
+        with count_queries() as statements:
+            started = time.perf_counter()
+            response = getattr(client, method)(url)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            self.errors[route] += 1
+        self.samples[route].append(elapsed)
+        self.queries[route].append(len(statements))
+        return response
+
+    def step(self, scenario):
+        rnd = self.rnd
+        student_id, student = rnd.choice(self.students)
+        if scenario == 'lessons':
+            self._request('GET /lessons', student, 'get', '/lessons')
+        elif scenario == 'api_lessons':
+            self._request('GET /api/lessons', student, 'get', '/api/lessons?window=week')
+        elif scenario == 'index':
+            self._request('GET /', student, 'get', '/')
+        elif scenario == 'lesson_detail':
+            self._request('GET /lesson/<id>', student, 'get', f'/lesson/{rnd.choice(self.upcoming)}')
+        elif scenario == 'me':
+            self._request('GET /me', student, 'get', '/me')
+        elif scenario == 'book':
+            lesson_id = rnd.choice(self.upcoming)
+            response = self._request('POST /book/<id>', student, 'post', f'/book/{lesson_id}')
+            if response.status_code < 400:
+                self._remember_booking(student_id, lesson_id)
+        elif scenario == 'cancel':
+            if not self.my_bookings[student_id]:
+                return self.step('book')
+            booking_id = self.my_bookings[student_id].pop()
+            self._request('POST /booking/<id>/cancel', student, 'post', f'/booking/{booking_id}/cancel')
+        elif scenario == 'admin_dashboard':
+            self._request('GET /admin', self.admin, 'get', '/admin')
+        elif scenario == 'admin_students':
+            self._request('GET /admin/students', self.admin, 'get', '/admin/students')
+        # flash после записи/отмены не должен копиться в сессии
+        if scenario in ('book', 'cancel'):
+            with student.session_transaction() as session:
+                session.pop('_flashes', None)
+
+    def _remember_booking(self, student_id, lesson_id):
+        from models import db, Booking
+
+        with self.app.app_context():
+            booking_id = db.session.scalar(
+                db.select(Booking.id).where(Booking.student_id == student_id, Booking.lesson_id == lesson_id)
+            )
+        if booking_id:
+            self.my_bookings[student_id].append(booking_id)
+
+    def run(self, mix, requests, warmup=20):
+        scenarios, weights = zip(*MIXES[mix].items())
+        for scenario in self.rnd.choices(scenarios, weights, k=warmup):
+            self.step(scenario)
+        self.samples.clear()
+        self.queries.clear()
+        self.errors.clear()
+
+        started = time.perf_counter()
+        for scenario in self.rnd.choices(scenarios, weights, k=requests):
+            self.step(scenario)
+        elapsed = time.perf_counter() - started
+        return self.report(mix, elapsed)
+
+    def report(self, mix, elapsed):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            queries = self.queries[route]
+            routes[route] = {
+                'requests': len(samples),
+                'errors': self.errors[route],
+                'rps': len(samples) / sum(samples) if sum(samples) else 0.0,
+                'p50_ms': percentile(samples, 50) * 1000,
+                'p95_ms': percentile(samples, 95) * 1000,
+                'p99_ms': percentile(samples, 99) * 1000,
+                'queries_avg': sum(queries) / len(queries),
+                'queries_max': max(queries),
+            }
+        total = sum(len(s) for s in self.samples.values())
+        return {
+            'mix': mix,
+            'requests': total,
+            'elapsed_s': elapsed,
+            'throughput_rps': total / elapsed if elapsed else 0.0,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'routes': routes,
+        }
+
+
+def print_report(result):
+    print(f"mix={result['mix']}: {result['requests']} requests in {result['elapsed_s']:.1f}s "
+          f"({result['throughput_rps']:.0f} req/s)")
+    print(f"{'route':<28}{'n':>6}{'err':>5}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'sql':>7}{'max':>5}")
+    for route, r in result['routes'].items():
+        print(f"{route:<28}{r['requests']:>6}{r['errors']:>5}{r['rps']:>8.0f}"
+              f"{r['p50_ms']:>8.1f}ms{r['p95_ms']:>7.1f}ms{r['p99_ms']:>7.1f}ms"
+              f"{r['queries_avg']:>7.1f}{r['queries_max']:>5}")
+
+
+def compare(result, baseline, tolerance):
+    """Печатает разницу с базовым прогоном, возвращает список регрессий."""
+    regressions = []
+    print(f"\nvs baseline {baseline.get('created', '?')} (tolerance {tolerance:.0%}):")
+    for route, r in result['routes'].items():
+        base = baseline['routes'].get(route)
+        if not base:
+            print(f'  {route:<28} new route')
+            continue
+        p95 = (r['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0.0
+        sql = r['queries_avg'] - base['queries_avg']
+        mark = '  '
+        if p95 > tolerance:
+            regressions.append(f'{route}: p95 {base["p95_ms"]:.1f}ms -> {r["p95_ms"]:.1f}ms')
+            mark = '⚠️'
+        if sql > max(0.5, base['queries_avg'] * tolerance):
+            regressions.append(f'{route}: sql {base["queries_avg"]:.1f} -> {r["queries_avg"]:.1f}')
+            mark = '⚠️'
+        print(f'{mark}{route:<28} p95 {p95:+7.1%}  sql {sql:+5.1f}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help='БД, подготовленная bench.datagen')
+    parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--students', type=int, default=20, help='сколько студентов логинится')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-page-cache', action='store_true', help='выключить кэш страниц')
+    parser.add_argument('--save', help='записать результат в JSON')
+    parser.add_argument('--compare', help='сравнить с JSON базового прогона')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+    from app import app
+    app.config['PAGE_CACHE_ENABLED'] = not args.no_page_cache
+    app.config['LOGIN_RATE_LIMIT'] = False  # все клиенты входят с одного адреса
+
+    harness = Harness(app, students=args.students, seed=args.seed)
+    result = harness.run(args.mix, args.requests)
+    print_report(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f'\n✅ saved to {args.save}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print('\n⚠️ Регрессии:\n  ' + '\n  '.join(regressions))
+            sys.exit(1)
+        print('\n✅ Регрессий нет.')
+
+
+if __name__ == '__main__':
+    main()
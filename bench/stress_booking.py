@@ -0,0 +1,137 @@
+"""Стресс-тест записи: сотни параллельных записей на несколько уроков.
+
+Запуск из корня репозитория::
+
+    python -m bench.stress_booking --students 400 --lessons 5 --capacity 12
+
+Проверяет, что ни на один урок не записано больше ``capacity`` студентов и
+что ``seats_taken`` совпадает с числом записей, а p99 латентности записи
+укладывается в ``--p99-ms``. Код возврата ненулевой при нарушении.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import func
+
+import booking
+from models import db, Booking, Direction, Group, Lesson, Student, Teacher, User
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[k]
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    db.init_app(app)
+    return app
+
+
+def seed(app, students, lessons, capacity):
+    with app.app_context():
+        db.create_all()
+        direction = Direction(name='Krump')
+        teacher = Teacher(user=User(email='t@bench', name='T', role='teacher', password_hash='-'))
+        group = Group(name='Krump open', direction=direction, teacher=teacher, capacity=capacity)
+        db.session.add(group)
+        start = datetime.now() + timedelta(days=1)
+        db.session.add_all(Lesson(group=group, start_dt=start + timedelta(hours=i)) for i in range(lessons))
+        db.session.add_all(
+            Student(user=User(email=f's{i}@bench', name=f'S{i}', role='student', password_hash='-'))
+            for i in range(students)
+        )
+        db.session.commit()
+        return ([l.id for l in Lesson.query.all()], [s.id for s in Student.query.all()])
+
+
+def run(app, lesson_ids, student_ids, workers, attempts_per_student):
+    def one(student_id, lesson_id):
+        with app.app_context():
+            lesson = db.session.get(Lesson, lesson_id)
+            student = db.session.get(Student, student_id)
+            started = time.perf_counter()
+            try:
+                booking.book(lesson, student, 'bench')
+                outcome = 'booked'
+            except booking.LessonFull:
+                outcome = 'full'
+            except booking.AlreadyBooked:
+                outcome = 'duplicate'
+            except Exception as e:
+                outcome = type(e).__name__
+            return outcome, time.perf_counter() - started
+
+    jobs = [(s, random.choice(lesson_ids)) for s in student_ids for _ in range(attempts_per_student)]
+    random.shuffle(jobs)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda job: one(*job), jobs))
+    return results, time.perf_counter() - started
+
+
+def check(app, capacity):
+    with app.app_context():
+        counts = dict(
+            db.session.query(Booking.lesson_id, func.count(Booking.id)).group_by(Booking.lesson_id).all()
+        )
+        problems = []
+        for lesson in Lesson.query.all():
+            taken = counts.get(lesson.id, 0)
+            if taken > capacity:
+                problems.append(f'lesson {lesson.id}: {taken} bookings > capacity {capacity}')
+            if taken != lesson.seats_taken:
+                problems.append(f'lesson {lesson.id}: seats_taken={lesson.seats_taken}, bookings={taken}')
+        return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=400)
+    parser.add_argument('--lessons', type=int, default=5)
+    parser.add_argument('--capacity', type=int, default=12)
+    parser.add_argument('--attempts', type=int, default=2, help='попыток записи на студента')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--p99-ms', type=float, default=1000.0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'stress.db'))
+        lesson_ids, student_ids = seed(app, args.students, args.lessons, args.capacity)
+        results, elapsed = run(app, lesson_ids, student_ids, args.workers, args.attempts)
+        problems = check(app, args.capacity)
+        with app.app_context():
+            db.engine.dispose()
+
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    latencies = [latency * 1000 for _, latency in results]
+    p50, p95, p99 = (percentile(latencies, p) for p in (50, 95, 99))
+    print(f'{len(results)} attempts in {elapsed:.2f}s ({len(results) / elapsed:.0f}/s): {outcomes}')
+    print(f'latency ms: p50={p50:.1f} p95={p95:.1f} p99={p99:.1f}')
+
+    errors = {k: v for k, v in outcomes.items() if k not in ('booked', 'full', 'duplicate')}
+    if errors:
+        problems.append(f'unexpected errors: {errors}')
+    if p99 > args.p99_ms:
+        problems.append(f'p99 {p99:.1f}ms > {args.p99_ms}ms')
+    for problem in problems:
+        print('FAIL:', problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
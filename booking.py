@@ -0,0 +1,268 @@
+"""Запись на уроки без овербукинга и лист ожидания.
+
+Занятые места хранятся счётчиком ``Lesson.seats_taken``. Место резервируется
+одним условным UPDATE (``seats_taken < capacity``), повторная запись
+отсекается уникальным индексом ``(lesson_id, student_id)``, а при
+"database is locked" от SQLite вся транзакция повторяется с backoff.
+
+Если мест нет, студент встаёт в очередь урока (``WaitlistEntry``, FIFO по
+id). ``cancel`` в той же транзакции отдаёт освободившееся место первому в
+очереди, так что страницу урока не нужно обновлять в ожидании отмены —
+позицию отдаёт ``waitlist_status`` одним запросом.
+
+Уведомления о записи и о переводе из очереди ставятся в ``jobs`` в той же
+транзакции и уходят из воркера, не задерживая ответ.
+"""
+import random
+import time
+from collections import namedtuple
+
+from sqlalchemy import delete, exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+import cache
+import jobs
+import stats
+import timeline
+from models import db, Booking, Group, Lesson, Student, User, WaitlistEntry
+
+
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.02
+
+
+class BookingError(Exception):
+    pass
+
+
+class LessonFull(BookingError):
+    pass
+
+
+class AlreadyBooked(BookingError):
+    pass
+
+
+class AlreadyWaiting(BookingError):
+    pass
+
+
+WaitlistStatus = namedtuple('WaitlistStatus', 'booked position waiting spots_left')
+
+
+def _is_busy(error):
+    message = str(error.orig).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def _violates(error, table, index_name):
+    """Нарушен ли уникальный индекс ``index_name``, а не FK или NOT NULL."""
+    diag = getattr(error.orig, 'diag', None)
+    if getattr(diag, 'constraint_name', None):
+        return diag.constraint_name == index_name
+    message = str(error.orig)
+    # SQLite называет не индекс, а его колонки
+    index = next(i for i in table.indexes if i.name == index_name)
+    columns = ', '.join(f'{table.name}.{c.name}' for c in index.columns)
+    return index_name in message or f'UNIQUE constraint failed: {columns}' in message
+
+
+def _retry_busy(fn):
+    for attempt in range(BUSY_RETRIES):
+        try:
+            return fn()
+        except OperationalError as e:
+            db.session.rollback()
+            if not _is_busy(e) or attempt == BUSY_RETRIES - 1:
+                raise
+            time.sleep(BUSY_BACKOFF * (2 ** attempt) * (1 + random.random()))
+
+
+def _take_seat(lesson_id):
+    capacity = select(Group.capacity).where(Group.id == Lesson.group_id).scalar_subquery()
+    result = db.session.execute(
+        update(Lesson)
+        .where(Lesson.id == lesson_id, Lesson.seats_taken < capacity)
+        .values(seats_taken=Lesson.seats_taken + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        cache.schedule_changed(db.session)
+    return result.rowcount == 1
+
+
+def _release_seat(lesson_id):
+    db.session.execute(
+        update(Lesson)
+        .where(Lesson.id == lesson_id, Lesson.seats_taken > 0)
+        .values(seats_taken=Lesson.seats_taken - 1)
+        .execution_options(synchronize_session=False)
+    )
+    cache.schedule_changed(db.session)
+
+
+def book(lesson, student, student_name):
+    """Записывает студента на урок и возвращает ``Booking``.
+
+    Бросает ``LessonFull`` или ``AlreadyBooked``; в обоих случаях
+    транзакция откатывается и счётчик мест не меняется.
+    """
+    group = lesson.group
+
+    def attempt():
+        if not _take_seat(lesson.id):
+            db.session.rollback()
+            raise LessonFull(lesson.id)
+        booking = Booking(
+            student_name=student_name,
+            direction_id=group.direction_id if group else None,
+            teacher_id=group.teacher_id if group else None,
+            lesson_id=lesson.id,
+            student_id=student.id,
+            attended=False,
+        )
+        # место получено — из очереди на этот урок студент выходит
+        db.session.execute(
+            delete(WaitlistEntry).where(WaitlistEntry.lesson_id == lesson.id, WaitlistEntry.student_id == student.id)
+        )
+        db.session.add(booking)
+        try:
+            db.session.flush()
+            jobs.enqueue('booking_confirmation', {'booking_id': booking.id})
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not _violates(e, Booking.__table__, 'uq_booking_lesson_student'):
+                raise
+            raise AlreadyBooked(lesson.id)
+        return booking
+
+    return _retry_busy(attempt)
+
+
+def cancel(booking):
+    """Удаляет запись, освобождает место и отдаёт его первому в очереди.
+
+    Всё в одной транзакции; возвращает id студента, получившего место, или ``None``.
+    """
+    booking_id, lesson_id, attended = booking.id, booking.lesson_id, booking.attended
+
+    def attempt():
+        promoted = None
+        deleted = db.session.execute(
+            Booking.__table__.delete().where(Booking.id == booking_id)
+        ).rowcount
+        if deleted:
+            _release_seat(lesson_id)
+            stats.apply_booking(db.session.connection(), lesson_id, attended, -1)
+            timeline.refresh(db.session.connection(), booking_ids=[booking_id])
+            promoted = _promote(lesson_id)
+        db.session.commit()
+        return promoted
+
+    promoted = _retry_busy(attempt)
+    db.session.expire_all()
+    return promoted
+
+
+def _promote(lesson_id):
+    """Записывает первого из очереди, если есть свободное место."""
+    already_booked = exists().where(Booking.lesson_id == lesson_id, Booking.student_id == WaitlistEntry.student_id)
+    waiter = db.session.execute(
+        select(WaitlistEntry.id, WaitlistEntry.student_id, User.name)
+        .join(Student, Student.id == WaitlistEntry.student_id)
+        .join(User, User.id == Student.user_id)
+        .where(WaitlistEntry.lesson_id == lesson_id, ~already_booked)
+        .order_by(WaitlistEntry.id)
+        .limit(1)
+    ).first()
+    if waiter is None or not _take_seat(lesson_id):
+        return None
+    group = db.session.execute(
+        select(Group.direction_id, Group.teacher_id).join(Lesson, Lesson.group_id == Group.id)
+        .where(Lesson.id == lesson_id)
+    ).first()
+    result = db.session.execute(insert(Booking).values(
+        student_name=waiter.name or 'Студент',
+        direction_id=group.direction_id,
+        teacher_id=group.teacher_id,
+        lesson_id=lesson_id,
+        student_id=waiter.student_id,
+        attended=False,
+    ))
+    db.session.execute(delete(WaitlistEntry).where(WaitlistEntry.id == waiter.id))
+    stats.apply_booking(db.session.connection(), lesson_id, False, 1)
+    timeline.refresh(db.session.connection(), booking_ids=[result.inserted_primary_key[0]])
+    jobs.enqueue('waitlist_promoted', {'lesson_id': lesson_id, 'student_id': waiter.student_id})
+    return waiter.student_id
+
+
+def join_waitlist(lesson, student):
+    """Ставит студента в конец очереди урока; возвращает позицию (с 1)."""
+    booked = db.session.scalar(
+        select(exists().where(Booking.lesson_id == lesson.id, Booking.student_id == student.id))
+    )
+    if booked:
+        raise AlreadyBooked(lesson.id)
+
+    def attempt():
+        db.session.add(WaitlistEntry(lesson_id=lesson.id, student_id=student.id))
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not _violates(e, WaitlistEntry.__table__, 'uq_waitlist_entry_lesson_student'):
+                raise
+            raise AlreadyWaiting(lesson.id)
+
+    _retry_busy(attempt)
+    return waitlist_status(lesson.id, student.id).position
+
+
+def leave_waitlist(lesson_id, student_id):
+    deleted = db.session.execute(
+        delete(WaitlistEntry).where(WaitlistEntry.lesson_id == lesson_id, WaitlistEntry.student_id == student_id)
+    ).rowcount
+    db.session.commit()
+    return bool(deleted)
+
+
+def waitlist_status(lesson_id, student_id):
+    """Запись, место в очереди (``None`` — не в очереди), длина очереди и свободные места.
+
+    Один SELECT из скалярных подзапросов — годится для частого опроса.
+    """
+    in_queue = WaitlistEntry.lesson_id == lesson_id
+    my_entry = select(WaitlistEntry.id).where(in_queue, WaitlistEntry.student_id == student_id).scalar_subquery()
+    capacity = select(Group.capacity).where(Group.id == Lesson.group_id).scalar_subquery()
+    row = db.session.execute(select(
+        exists().where(Booking.lesson_id == lesson_id, Booking.student_id == student_id),
+        select(func.count(WaitlistEntry.id)).where(in_queue, WaitlistEntry.id <= my_entry).scalar_subquery(),
+        select(func.count(WaitlistEntry.id)).where(in_queue).scalar_subquery(),
+        select(capacity - Lesson.seats_taken).where(Lesson.id == lesson_id).scalar_subquery(),
+    )).one()
+    booked, position, waiting, spots_left = row
+    return WaitlistStatus(bool(booked), position or None, waiting, spots_left)
+
+
+def recount_seats():
+    """Пересчитывает ``seats_taken`` по таблице записей (для бэкфилла)."""
+    taken = (
+        select(func.count(Booking.id))
+        .where(Booking.lesson_id == Lesson.id)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(Lesson).values(seats_taken=taken).execution_options(synchronize_session=False)
+    )
+    cache.schedule_changed(db.session)
+    db.session.commit()
+
+
+def student_of_user(user_id):
+    """``Student.id`` пользователя как скалярный подзапрос — для ``waitlist_status`` без лишнего SELECT."""
+    return select(Student.id).where(Student.user_id == user_id).scalar_subquery()
+
+
+def waitlist_etag(status):
+    return 'w-' + '-'.join(str(value) for value in status)
@@ -0,0 +1,334 @@
+"""Кэш отрендеренных публичных страниц (/, /directions, /teachers, ...).
+
+Эти страницы меняются только когда администратор правит направления,
+преподавателей, группы, абонементы или уроки (главная показывает ближайшие). Поэтому готовый HTML хранится в
+ограниченном LRU с TTL внутри процесса и, при необходимости, в общем
+бэкенде (файлы или SQLite), чтобы его видели все воркеры gunicorn.
+
+Инвалидация — через "поколение" кэша: любой commit, затронувший
+``CATALOG_MODELS`` (или имя преподавателя в ``User``), меняет поколение, и старые ключи перестают находиться;
+запись в обход ORM (серии уроков) отмечает транзакцию ``catalog_changed``.
+Каждый ответ несёт ETag и Last-Modified, так что браузер получает 304.
+
+Так же устроена версия расписания для ``/api/v1`` (``schedule_version``):
+её меняет commit, затронувший ``SCHEDULE_MODELS``, а код, который пишет в
+обход ORM (места в ``booking``, серии в ``scheduling``), отмечает транзакцию
+через ``schedule_changed``. Версия должна быть общей для всех воркеров,
+поэтому при ``PAGE_CACHE_BACKEND=memory`` она лежит в отдельном SQLite-файле
+(``SCHEDULE_VERSION_DB``), а не в процессе.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, has_app_context, make_response, request, session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from werkzeug.http import http_date, parse_date
+
+from identity import current_identity
+from models import Abonement, Booking, Direction, Group, Lesson, Subscription, Teacher, User
+
+
+CATALOG_MODELS = (Direction, Teacher, Group, Abonement, Subscription, Lesson)
+# записи входят сюда из-за свободных мест в ответах API
+SCHEDULE_MODELS = (Lesson, Group, Direction, Teacher, Booking)
+
+CachedPage = namedtuple('CachedPage', 'body etag last_modified content_type')
+
+
+class LRUCache:
+    """Потокобезопасный LRU с TTL на запись."""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MemoryBackend:
+    """Поколение живёт в процессе: годится для одного воркера."""
+
+    shared = False
+
+    def __init__(self):
+        self._generations = {}
+
+    def generation(self, name='pages'):
+        return self._generations.setdefault(name, str(time.time_ns()))
+
+    def bump(self, name='pages'):
+        self._generations[name] = str(time.time_ns())
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+
+class FileSystemBackend:
+    shared = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def _write(self, path, data):
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _generation_path(self, name):
+        return os.path.join(self.directory, f'generation-{name}')
+
+    def generation(self, name='pages'):
+        try:
+            with open(self._generation_path(name)) as f:
+                return f.read()
+        except FileNotFoundError:
+            self.bump(name)
+            return self.generation(name)
+
+    def bump(self, name='pages'):
+        self._write(self._generation_path(name), str(time.time_ns()).encode())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if expires >= time.time() else None
+
+    def set(self, key, value, ttl):
+        self._write(self._path(key), pickle.dumps((time.time() + ttl, value)))
+
+
+class SQLiteBackend:
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS page_cache '
+                         '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def generation(self, name='pages'):
+        with self._connect() as conn:
+            row = conn.execute('SELECT value FROM page_cache WHERE key = ?', (f'__generation_{name}__',)).fetchone()
+        if row is None:
+            self.bump(name)
+            return self.generation(name)
+        return row[0].decode()
+
+    def bump(self, name='pages'):
+        self._put(f'__generation_{name}__', str(time.time_ns()).encode(), float('inf'))
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires FROM page_cache WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        self._put(key, pickle.dumps(value), time.time() + ttl)
+
+    def _put(self, key, value, expires):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO page_cache (key, value, expires) VALUES (?, ?, ?)',
+                         (key, value, expires))
+
+
+class PageCache:
+    def __init__(self, backend=None, maxsize=256, ttl=300):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.local = LRUCache(maxsize, ttl)
+
+    def get(self, key):
+        key = f'{self.backend.generation()}:{key}'
+        page = self.local.get(key)
+        if page is None and self.backend.shared:
+            page = self.backend.get(key)
+            if page is not None:
+                self.local.set(key, page)
+        return page
+
+    def set(self, key, page):
+        key = f'{self.backend.generation()}:{key}'
+        self.local.set(key, page)
+        if self.backend.shared:
+            self.backend.set(key, page, self.ttl)
+
+    def invalidate(self):
+        self.backend.bump()
+        self.local.clear()
+
+
+def _make_backend(app):
+    kind = app.config['PAGE_CACHE_BACKEND']
+    if kind == 'memory':
+        return MemoryBackend()
+    if kind == 'filesystem':
+        return FileSystemBackend(app.config['PAGE_CACHE_DIR'] or os.path.join(app.instance_path, 'page_cache'))
+    if kind == 'sqlite':
+        os.makedirs(app.instance_path, exist_ok=True)
+        return SQLiteBackend(app.config['PAGE_CACHE_DIR'] or os.path.join(app.instance_path, 'page_cache.db'))
+    raise ValueError(f'unknown PAGE_CACHE_BACKEND: {kind}')
+
+
+def init_page_cache(app):
+    app.config.setdefault('PAGE_CACHE_ENABLED', True)
+    app.config.setdefault('PAGE_CACHE_BACKEND', 'memory')
+    app.config.setdefault('PAGE_CACHE_DIR', None)
+    app.config.setdefault('PAGE_CACHE_SIZE', 256)
+    app.config.setdefault('PAGE_CACHE_TTL', 300)
+    app.config.setdefault('SCHEDULE_VERSION_DB', None)
+    backend = _make_backend(app)
+    app.extensions['page_cache'] = PageCache(backend, app.config['PAGE_CACHE_SIZE'], app.config['PAGE_CACHE_TTL'])
+    if not backend.shared:
+        os.makedirs(app.instance_path, exist_ok=True)
+        backend = SQLiteBackend(app.config['SCHEDULE_VERSION_DB']
+                                or os.path.join(app.instance_path, 'schedule_version.db'))
+    app.extensions['schedule_versions'] = backend
+
+
+def page_cache():
+    return current_app.extensions['page_cache']
+
+
+def schedule_version():
+    return current_app.extensions['schedule_versions'].generation('schedule')
+
+
+def catalog_changed(session):
+    """Отмечает, что транзакция меняет каталог в обход ORM."""
+    session.info['catalog_changed'] = True
+
+
+def schedule_changed(session):
+    """Отмечает, что транзакция меняет расписание в обход ORM."""
+    session.info['schedule_changed'] = True
+
+
+def _not_modified(page):
+    if request.if_none_match and page.etag in request.if_none_match:
+        return True
+    since = parse_date(request.headers.get('If-Modified-Since'))
+    return not request.if_none_match and since is not None and int(page.last_modified) <= since.timestamp()
+
+
+def _respond(page):
+    if _not_modified(page):
+        response = make_response('', 304)
+    else:
+        response = make_response(page.body)
+        response.content_type = page.content_type
+    response.set_etag(page.etag)
+    response.headers['Last-Modified'] = http_date(int(page.last_modified))
+    response.headers['Cache-Control'] = 'private, no-cache' if 'user_id' in session else 'public, no-cache'
+    return response
+
+
+def cached_page(view):
+    """Кэширует GET-ответ view с учётом пользователя из claims сессии."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if (not current_app.config['PAGE_CACHE_ENABLED'] or request.method != 'GET'
+                or session.get('_flashes')):
+            return view(*args, **kwargs)
+        identity = current_identity()
+        # identity — namedtuple из claims или ``User`` из БД; у обоих есть эти поля
+        who = (identity.id, identity.role, identity.name) if identity else ''
+        key = f'{request.full_path}|{who}'
+        cache = page_cache()
+        page = cache.get(key)
+        if page is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.direct_passthrough:
+                return response
+            body = response.get_data()
+            page = CachedPage(body, hashlib.sha1(body).hexdigest(), time.time(), response.content_type)
+            cache.set(key, page)
+        return _respond(page)
+    return wrapper
+
+
+def _teacher_renamed(session, obj):
+    """Имя преподавателя хранится в ``User``, а показывается в каталоге и API."""
+    if not isinstance(obj, User) or obj not in session.dirty:
+        return False
+    state = inspect(obj)
+    if not (state.attrs.name.history.has_changes() or state.attrs.role.history.has_changes()):
+        return False
+    roles = {obj.role, *state.attrs.role.history.deleted}
+    return 'teacher' in roles
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_catalog_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, CATALOG_MODELS) or _teacher_renamed(session, obj):
+            session.info['catalog_changed'] = True
+        if isinstance(obj, SCHEDULE_MODELS) or _teacher_renamed(session, obj):
+            session.info['schedule_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    catalog = session.info.pop('catalog_changed', False)
+    schedule = session.info.pop('schedule_changed', False)
+    if not has_app_context():
+        return
+    cache = current_app.extensions.get('page_cache')
+    if catalog and cache is not None:
+        cache.invalidate()
+    versions = current_app.extensions.get('schedule_versions')
+    if schedule and versions is not None:
+        versions.bump('schedule')
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_on_rollback(session, previous_transaction):
+    session.info.pop('catalog_changed', None)
+    session.info.pop('schedule_changed', None)
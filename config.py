@@ -0,0 +1,151 @@
+"""Настройки приложения и подключения к БД из переменных окружения.
+
+SQLite (по умолчанию) получает WAL, ``synchronous=NORMAL``, ``busy_timeout``,
+``mmap_size`` и ``cache_size`` на каждом новом соединении — это убирает
+"database is locked" при нескольких воркерах gunicorn. Для Postgres/MySQL
+настраивается пул: размер, ``pre_ping`` и ``recycle``.
+
+Переменные окружения::
+
+    DATABASE_URL            sqlite:///studio.db | postgresql://...
+    SECRET_KEY
+    DB_POOL_SIZE            10
+    DB_MAX_OVERFLOW         20
+    DB_POOL_TIMEOUT         30   (секунд)
+    DB_POOL_RECYCLE         1800 (секунд)
+    DB_POOL_PRE_PING        1
+    SQLITE_BUSY_TIMEOUT_MS  5000
+    SQLITE_SYNCHRONOUS      NORMAL
+    SQLITE_MMAP_SIZE        268435456
+    SQLITE_CACHE_SIZE       -65536 (отрицательное — в КиБ)
+    PAGE_CACHE_BACKEND      memory | filesystem | sqlite
+    DB_SELF_CHECK           1 — вывести эффективные настройки при старте
+    PROFILING               1 — профилирование запросов (см. profiling.py)
+    PROFILING_SLOW_MS       500
+    PROFILING_SAMPLE_RATE   0.01 (доля запросов под cProfile)
+    PROFILING_DIR           instance/profiles
+    PROFILING_METRICS_TOKEN токен для /admin/metrics без входа админом
+    JOBS_INLINE             1 — выполнять фоновые задачи сразу (см. jobs.py)
+    JOBS_THREADS            2 (потоков у ``flask jobs worker``)
+    PASSWORD_HASH_METHOD    scrypt:32768:8:1 | pbkdf2:sha256:600000 | ... (см. passwords.py)
+    LOGIN_RATE_LIMIT        0 — выключить ограничение попыток входа (см. ratelimit.py)
+    RATELIMIT_STORE         sqlite | memory
+    TRUSTED_PROXIES         0 (сколько прокси перед приложением добавляют X-Forwarded-For)
+    API_ETAG_WINDOW         300 (секунд; см. api.py)
+    SCHEDULE_VERSION_DB     instance/schedule_version.db (при PAGE_CACHE_BACKEND=memory)
+"""
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from models import db
+
+
+DEFAULT_DATABASE_URL = 'sqlite:///studio.db'
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(int(default))).lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_url():
+    url = os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    # Heroku и подобные отдают устаревшую схему postgres://
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def sqlite_pragmas():
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': _env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        'cache_size': _env_int('SQLITE_CACHE_SIZE', -64 * 1024),
+    }
+
+
+def engine_options(url):
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {'connect_args': {'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000}}
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', 10),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+    }
+
+
+def load_config(app):
+    url = database_url()
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', app.config.get('SECRET_KEY'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+    app.config['SQLITE_PRAGMAS'] = sqlite_pragmas()
+    if 'PAGE_CACHE_BACKEND' in os.environ:
+        app.config['PAGE_CACHE_BACKEND'] = os.environ['PAGE_CACHE_BACKEND']
+    app.config['PROFILING'] = _env_bool('PROFILING', False)
+    app.config['PROFILING_SLOW_MS'] = _env_int('PROFILING_SLOW_MS', 500)
+    app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.01))
+    app.config['PROFILING_DIR'] = os.environ.get('PROFILING_DIR')
+    app.config['PROFILING_METRICS_TOKEN'] = os.environ.get('PROFILING_METRICS_TOKEN')
+    app.config['JOBS_INLINE'] = _env_bool('JOBS_INLINE', False)
+    app.config['JOBS_THREADS'] = _env_int('JOBS_THREADS', 2)
+    if 'PASSWORD_HASH_METHOD' in os.environ:
+        app.config['PASSWORD_HASH_METHOD'] = os.environ['PASSWORD_HASH_METHOD']
+    app.config['LOGIN_RATE_LIMIT'] = _env_bool('LOGIN_RATE_LIMIT', True)
+    if 'RATELIMIT_STORE' in os.environ:
+        app.config['RATELIMIT_STORE'] = os.environ['RATELIMIT_STORE']
+    app.config['TRUSTED_PROXIES'] = _env_int('TRUSTED_PROXIES', 0)
+    app.config['API_ETAG_WINDOW'] = _env_int('API_ETAG_WINDOW', 300)
+    if 'SCHEDULE_VERSION_DB' in os.environ:
+        app.config['SCHEDULE_VERSION_DB'] = os.environ['SCHEDULE_VERSION_DB']
+
+
+def init_db_config(app):
+    """Вызывать после ``db.init_app(app)``: вешает PRAGMA на соединения SQLite."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'sqlite':
+        pragmas = app.config['SQLITE_PRAGMAS']
+
+        @event.listens_for(engine, 'connect')
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+
+    if _env_bool('DB_SELF_CHECK', False):
+        with app.app_context():
+            for name, value in effective_settings().items():
+                app.logger.warning('db: %s = %s', name, value)
+
+
+def effective_settings():
+    """Фактические настройки движка, прочитанные из живого соединения."""
+    engine = db.engine
+    settings = {
+        'url': engine.url.render_as_string(hide_password=True),
+        'dialect': engine.dialect.name,
+        'pool': type(engine.pool).__name__,
+    }
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                settings[name] = conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+    else:
+        pool = engine.pool
+        settings['pool_size'] = pool.size() if hasattr(pool, 'size') else None
+        settings['pool_recycle'] = getattr(pool, '_recycle', None)
+        settings['pool_pre_ping'] = getattr(pool, '_pre_ping', None)
+        with engine.connect():
+            settings['server_version'] = '.'.join(map(str, engine.dialect.server_version_info or ()))
+    return settings
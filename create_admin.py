@@ -1,5 +1,5 @@
 from app import app, db, User
-from werkzeug.security import generate_password_hash
+from passwords import hash_password
 
 with app.app_context():
     # создаём администратора
@@ -7,7 +7,7 @@ with app.app_context():
         email="admin@studio.local",
         name="Администратор",
         role="admin",
-        password_hash=generate_password_hash("admin123")
+        password_hash=hash_password("admin123")
     )
     db.session.add(admin)
     db.session.commit()
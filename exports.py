@@ -0,0 +1,217 @@
+"""Выгрузки для админа в CSV: записи (с посещением), платежи, уроки.
+
+Строки читаются курсором пачками по ``EXPORT_BATCH`` (``yield_per``) и сразу
+пишутся в ответ (``csv_chunks`` — генератор байтов), поэтому память не
+растёт с размером выгрузки. Выбираются только колонки, без ORM-объектов,
+так что identity map сессии тоже остаётся пустой. ``gzip_chunks`` сжимает
+поток на лету.
+
+CSV открывается в Excel без мастера импорта: UTF-8 с BOM и ``\\r\\n``.
+Текст, который Excel принял бы за формулу (имя ``=HYPERLINK(...)`` из
+формы регистрации), выводится с префиксом ``'``.
+Фильтры: период (по времени урока, для платежей — по дате платежа),
+группа и преподаватель (для платежей — группа студента).
+"""
+import csv
+import io
+import zlib
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, false, func, select
+from sqlalchemy.orm import aliased
+
+from models import db, Booking, Direction, Group, Lesson, Payment, Student, Teacher, User
+
+
+# с этих символов Excel начинает формулу
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+EXPORT_BATCH = 1000
+CHUNK_SIZE = 64 * 1024
+
+Filters = namedtuple('Filters', 'date_from date_to group_id teacher_id')
+NO_FILTERS = Filters(None, None, None, None)
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _day(value, name):
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{name}: ожидается дата YYYY-MM-DD')
+
+
+def _id(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ExportError(f'{name}: ожидается число')
+
+
+def parse_filters(args):
+    """Фильтры из ``request.args`` (``from``, ``to``, ``group_id``, ``teacher_id``)."""
+    filters = Filters(_day(args.get('from'), 'from'), _day(args.get('to'), 'to'),
+                      _id(args.get('group_id'), 'group_id'), _id(args.get('teacher_id'), 'teacher_id'))
+    if filters.date_from and filters.date_to and filters.date_to < filters.date_from:
+        raise ExportError('to раньше from')
+    return filters
+
+
+def _period(column, filters):
+    """Условия на ``column`` в днях ``[date_from, date_to]`` включительно."""
+    conditions = []
+    if filters.date_from:
+        conditions.append(column >= datetime.combine(filters.date_from, time()))
+    if filters.date_to:
+        conditions.append(column < datetime.combine(filters.date_to + timedelta(days=1), time()))
+    return conditions
+
+
+def _group_conditions(group, filters):
+    conditions = []
+    if filters.group_id is not None:
+        conditions.append(group.id == filters.group_id)
+    if filters.teacher_id is not None:
+        conditions.append(group.teacher_id == filters.teacher_id)
+    return conditions
+
+
+def bookings_query(filters):
+    student_user, teacher_user = aliased(User), aliased(User)
+    return (
+        select(
+            Booking.id, Lesson.id, Lesson.start_dt, Group.name, Direction.name, teacher_user.name,
+            Student.id, student_user.name, student_user.email,
+            func.coalesce(Booking.attended, false()), Booking.created_at,
+        )
+        .join(Lesson, Lesson.id == Booking.lesson_id)
+        .join(Student, Student.id == Booking.student_id)
+        .join(student_user, student_user.id == Student.user_id)
+        .outerjoin(Group, Group.id == Lesson.group_id)
+        .outerjoin(Direction, Direction.id == Group.direction_id)
+        .outerjoin(Teacher, Teacher.id == Group.teacher_id)
+        .outerjoin(teacher_user, teacher_user.id == Teacher.user_id)
+        .where(*_period(Lesson.start_dt, filters), *_group_conditions(Group, filters))
+        .order_by(Lesson.start_dt, Lesson.id, Booking.id)
+    )
+
+
+def payments_query(filters):
+    return (
+        select(Payment.id, Payment.created_at, Student.id, User.name, User.email, Group.name,
+               Payment.amount, Payment.note)
+        .outerjoin(Student, Student.id == Payment.student_id)
+        .outerjoin(User, User.id == Student.user_id)
+        .outerjoin(Group, Group.id == Student.group_id)
+        .where(*_period(Payment.created_at, filters), *_group_conditions(Group, filters))
+        # id растёт вместе с created_at, а сортировка по нему не требует временного индекса
+        .order_by(Payment.id)
+    )
+
+
+def lessons_query(filters):
+    teacher_user = aliased(User)
+    attended = (
+        select(func.count(Booking.id))
+        .where(and_(Booking.lesson_id == Lesson.id, Booking.attended))
+        .correlate(Lesson)
+        .scalar_subquery()
+    )
+    return (
+        select(Lesson.id, Lesson.start_dt, Lesson.duration_minutes, Group.name, Direction.name,
+               teacher_user.name, Group.location, Group.capacity, Lesson.seats_taken, attended)
+        .outerjoin(Group, Group.id == Lesson.group_id)
+        .outerjoin(Direction, Direction.id == Group.direction_id)
+        .outerjoin(Teacher, Teacher.id == Group.teacher_id)
+        .outerjoin(teacher_user, teacher_user.id == Teacher.user_id)
+        .where(*_period(Lesson.start_dt, filters), *_group_conditions(Group, filters))
+        .order_by(Lesson.start_dt, Lesson.id)
+    )
+
+
+# вид выгрузки -> (заголовок CSV, построитель запроса)
+EXPORTS = {
+    'bookings': (
+        ('booking_id', 'lesson_id', 'lesson_start', 'group', 'direction', 'teacher',
+         'student_id', 'student', 'email', 'attended', 'booked_at'),
+        bookings_query,
+    ),
+    'payments': (
+        ('payment_id', 'created_at', 'student_id', 'student', 'email', 'group', 'amount', 'note'),
+        payments_query,
+    ),
+    'lessons': (
+        ('lesson_id', 'start', 'duration_minutes', 'group', 'direction', 'teacher', 'location',
+         'capacity', 'seats_taken', 'attended'),
+        lessons_query,
+    ),
+}
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def rows(kind, filters=NO_FILTERS, batch=EXPORT_BATCH):
+    """Строки выгрузки ``kind``, выбираются из БД пачками по ``batch``."""
+    if kind not in EXPORTS:
+        raise ExportError(f'неизвестная выгрузка: {kind}')
+    _, build = EXPORTS[kind]
+    result = db.session.execute(build(filters).execution_options(yield_per=batch))
+    for row in result:
+        yield [_cell(value) for value in row]
+
+
+def csv_chunks(kind, filters=NO_FILTERS, chunk_size=CHUNK_SIZE):
+    """CSV выгрузки ``kind`` кусками примерно по ``chunk_size`` байт."""
+    header, _ = EXPORTS[kind]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for row in rows(kind, filters):
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Сжимает поток байтов в gzip, не собирая его в памяти."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def filename(kind, filters):
+    parts = [kind]
+    if filters.date_from or filters.date_to:
+        parts.append(f'{filters.date_from or ""}_{filters.date_to or ""}')
+    if filters.group_id is not None:
+        parts.append(f'group{filters.group_id}')
+    if filters.teacher_id is not None:
+        parts.append(f'teacher{filters.teacher_id}')
+    return '-'.join(parts) + '.csv'
@@ -0,0 +1,65 @@
+"""Текущий пользователь: один запрос к БД на HTTP-запрос, а то и ни одного.
+
+``current_user()`` загружает ``User`` вместе с профилем студента/преподавателя
+один раз и кладёт его в ``flask.g``. Для шапки и публичных страниц хватает
+имени и роли — они лежат в подписанной cookie сессии, и ``current_identity()``
+отдаёт их без обращения к БД. Для проверок прав используйте только
+``current_user()``.
+"""
+from collections import namedtuple
+
+from flask import abort, current_app, g, session
+from sqlalchemy.orm import joinedload
+
+from models import db, User
+
+
+Identity = namedtuple('Identity', 'id name role')
+
+_MISSING = object()
+
+
+def current_user():
+    user = g.get('_current_user', _MISSING)
+    if user is _MISSING:
+        uid = session.get('user_id')
+        user = None
+        if uid:
+            user = db.session.get(User, uid, options=[joinedload(User.student), joinedload(User.teacher)])
+            if user is None:
+                logout_user()
+        g._current_user = user
+    return user
+
+
+def current_identity():
+    """Имя и роль пользователя для шаблонов; без БД, если в сессии есть claims."""
+    if 'user_id' not in session:
+        return None
+    claims = session.get('identity')
+    if claims and current_app.config['IDENTITY_SESSION_CLAIMS']:
+        return Identity(**claims)
+    return current_user()
+
+
+def login_user(user):
+    session['user_id'] = user.id
+    session['identity'] = {'id': user.id, 'name': user.name, 'role': user.role}
+    g._current_user = user
+
+
+def logout_user():
+    session.pop('user_id', None)
+    session.pop('identity', None)
+    g.pop('_current_user', None)
+
+
+def require_role(*roles):
+    user = current_user()
+    if not user or user.role not in roles:
+        abort(403)
+    return user
+
+
+def init_identity(app):
+    app.config.setdefault('IDENTITY_SESSION_CLAIMS', True)
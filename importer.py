@@ -0,0 +1,159 @@
+"""Массовый импорт студентов из CSV (начало сезона — сотни строк).
+
+CSV читается построчно и обрабатывается пачками по ``batch_size``: для
+пачки одним запросом ищутся уже занятые email, пароли хэшируются в пуле
+процессов, а ``User`` и ``Student`` вставляются executemany в одной
+транзакции на пачку. Ошибочные строки не прерывают импорт и попадают в
+отчёт с номером строки; email, занятый параллельной регистрацией между
+проверкой и вставкой, тоже становится ошибкой своей строки.
+
+Колонки: ``name``, ``email``, ``password`` (обязательные), ``phone``,
+``group_id`` (необязательные; ``group_id`` сразу записывает в группу).
+"""
+import csv
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+import stats
+from passwords import hash_password, policy_method
+from models import db, Group, Student, User
+
+
+BATCH_SIZE = 500
+
+RowError = namedtuple('RowError', 'line email message')
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f'{self.imported} imported, {len(self.errors)} errors, '
+                f'{self.elapsed:.2f}s ({self.rows_per_sec:.0f} rows/s)')
+
+
+def _validate(line, row, group_ids, seen):
+    name = (row.get('name') or '').strip()
+    email = (row.get('email') or '').strip().lower()
+    password = row.get('password') or ''
+    group_id = (row.get('group_id') or '').strip()
+    if not name or not email or not password:
+        return RowError(line, email, 'name, email и password обязательны')
+    if '@' not in email:
+        return RowError(line, email, 'некорректный email')
+    if email in seen:
+        return RowError(line, email, f'email повторяется (строка {seen[email]})')
+    if group_id:
+        if not group_id.isdigit() or int(group_id) not in group_ids:
+            return RowError(line, email, f'группа {group_id} не найдена')
+    seen[email] = line
+    return {
+        'line': line,
+        'name': name,
+        'email': email,
+        'password': password,
+        'phone': (row.get('phone') or '').strip() or None,
+        'group_id': int(group_id) if group_id else None,
+    }
+
+
+def _without_registered(rows, report):
+    """Отбрасывает строки с уже занятыми email, записывая их в ошибки."""
+    emails = [r['email'] for r in rows]
+    existing = set(db.session.scalars(select(User.email).where(User.email.in_(emails))))
+    for r in rows:
+        if r['email'] in existing:
+            report.errors.append(RowError(r['line'], r['email'], 'email уже зарегистрирован'))
+    return [r for r in rows if r['email'] not in existing]
+
+
+def _insert(rows):
+    db.session.execute(insert(User), [
+        {'name': r['name'], 'email': r['email'], 'role': 'student', 'password_hash': r['password_hash']}
+        for r in rows
+    ])
+    ids = dict(db.session.execute(
+        select(User.email, User.id).where(User.email.in_([r['email'] for r in rows]))
+    ).all())
+    db.session.execute(insert(Student), [
+        {'user_id': ids[r['email']], 'phone': r['phone'], 'group_id': r['group_id']} for r in rows
+    ])
+    stats.apply_counter(db.session.connection(), 'students', len(rows))
+
+
+def _flush_batch(batch, report, hash_passwords):
+    fresh = _without_registered(batch, report)
+    if not fresh:
+        return
+
+    for r, h in zip(fresh, hash_passwords([r['password'] for r in fresh])):
+        r['password_hash'] = h
+    while fresh:
+        try:
+            _insert(fresh)
+            db.session.commit()
+            break
+        except IntegrityError:
+            # email заняли после проверки — пачку повторяем без этих строк
+            db.session.rollback()
+            remaining = _without_registered(fresh, report)
+            if len(remaining) == len(fresh):
+                raise
+            fresh = remaining
+    report.imported += len(fresh)
+
+
+def import_students(stream, batch_size=BATCH_SIZE, workers=None):
+    """Импортирует студентов из текстового потока CSV, возвращает ``ImportReport``.
+
+    ``workers`` — число процессов для хэширования паролей (``0`` — в текущем
+    процессе, ``None`` — по числу CPU).
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    group_ids = set(db.session.scalars(select(Group.id)))
+    seen = {}
+    if workers is None:
+        workers = os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+    method = policy_method()
+
+    def hash_passwords(passwords):
+        if pool is None:
+            return [hash_password(p, method) for p in passwords]
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(partial(hash_password, method=method), passwords, chunksize=chunksize))
+
+    try:
+        batch = []
+        # строка 1 — заголовок
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            result = _validate(line, row, group_ids, seen)
+            if isinstance(result, RowError):
+                report.errors.append(result)
+                continue
+            batch.append(result)
+            if len(batch) >= batch_size:
+                _flush_batch(batch, report, hash_passwords)
+                batch = []
+        if batch:
+            _flush_batch(batch, report, hash_passwords)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        report.errors.sort()
+        report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,329 @@
+"""Фоновые задачи: очередь в таблице ``job`` и воркер ``flask jobs worker``.
+
+``enqueue`` кладёт задачу в текущую транзакцию, поэтому она появится
+только если закоммитится и то, что её породило (запись на урок, перевод
+из листа ожидания). Воркер — отдельный процесс (``worker:`` в Procfile) с
+несколькими потоками: задача забирается условным UPDATE
+``status='queued' -> 'running'``, упавшая повторяется с растущей паузой до
+``max_attempts``, зависшие в ``running`` после падения воркера
+возвращаются в очередь. ``idempotency_key`` уникален: повторная
+постановка с тем же ключом возвращает уже существующую задачу.
+
+Пароли в очередь не попадают: для хэша нужен открытый пароль, хранить его
+в таблице нельзя, поэтому ``generate_password_hash`` остаётся в запросе.
+
+``JOBS_INLINE`` — выполнять задачи сразу при постановке (разработка и
+сравнение в ``bench.bench_jobs``).
+"""
+import inspect
+import json
+import os
+import signal
+import socket
+import threading
+import traceback
+from datetime import datetime, time, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, select, update
+
+import stats
+import timeline
+from models import db, Booking, Job, Lesson, Student, User
+
+
+RETRY_BACKOFF = 30       # секунд, удваивается с каждой попыткой
+STALE_AFTER = timedelta(minutes=15)
+KEEP_FINISHED = timedelta(days=30)
+NIGHTLY_AT = time(3, 0)
+HOUSEKEEPING_EVERY = 60  # секунд
+
+HANDLERS = {}
+
+
+class JobError(Exception):
+    pass
+
+
+def handler(kind):
+    """Регистрирует функцию-обработчик задач вида ``kind``."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, payload=None, key=None, run_at=None, max_attempts=3):
+    """Ставит задачу в очередь в текущей транзакции; коммитит вызывающий код."""
+    if kind not in HANDLERS:
+        raise JobError(f'unknown job kind: {kind}')
+    check_payload(kind, payload or {})
+    if key is not None:
+        existing = db.session.scalar(select(Job).where(Job.idempotency_key == key))
+        if existing is not None:
+            return existing
+    now = datetime.now()
+    job = Job(kind=kind, payload=json.dumps(payload or {}), status='queued', attempts=0,
+              max_attempts=max_attempts, run_at=run_at or now, idempotency_key=key, created_at=now)
+    if current_app.config.get('JOBS_INLINE', False):
+        job.attempts = 1
+        job.started_at = now
+        job.result = _dump(HANDLERS[kind](**(payload or {})))
+        job.status = 'done'
+        job.finished_at = datetime.now()
+    db.session.add(job)
+    return job
+
+
+def check_payload(kind, payload):
+    """Проверяет, что ``payload`` подходит под аргументы обработчика ``kind``."""
+    if not isinstance(payload, dict):
+        raise JobError('payload must be an object')
+    try:
+        inspect.signature(HANDLERS[kind]).bind(**payload)
+    except TypeError as e:
+        raise JobError(f'bad payload for {kind}: {e}')
+
+
+def _dump(result):
+    return json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_at': job.run_at.isoformat(),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'idempotency_key': job.idempotency_key,
+        'result': json.loads(job.result) if job.result else None,
+        'last_error': job.last_error,
+    }
+
+
+# --- обработчики ---
+
+def notify(email, text):
+    """Отправка уведомления. Почтового транспорта пока нет — пишем в лог."""
+    current_app.logger.info('notify %s: %s', email, text)
+
+
+@handler('booking_confirmation')
+def booking_confirmation(booking_id):
+    row = db.session.execute(
+        select(User.email, User.name, Lesson.start_dt)
+        .select_from(Booking)
+        .join(Lesson, Lesson.id == Booking.lesson_id)
+        .join(Student, Student.id == Booking.student_id)
+        .join(User, User.id == Student.user_id)
+        .where(Booking.id == booking_id)
+    ).first()
+    if row is None:
+        return {'skipped': 'booking cancelled'}
+    notify(row.email, f'{row.name}, вы записаны на урок {row.start_dt:%d.%m %H:%M}')
+    return {'sent_to': row.email}
+
+
+@handler('waitlist_promoted')
+def waitlist_promoted(lesson_id, student_id):
+    row = db.session.execute(
+        select(User.email, User.name).join(Student, Student.user_id == User.id).where(Student.id == student_id)
+    ).first()
+    start_dt = db.session.scalar(select(Lesson.start_dt).where(Lesson.id == lesson_id))
+    if row is None or start_dt is None:
+        return {'skipped': 'student or lesson removed'}
+    notify(row.email, f'{row.name}, освободилось место — вы записаны на урок {start_dt:%d.%m %H:%M}')
+    return {'sent_to': row.email}
+
+
+@handler('rebuild_aggregates')
+def rebuild_aggregates():
+    stats.rebuild()
+    timeline.rebuild()
+    return {'rebuilt': ['stats', 'timeline']}
+
+
+# --- воркер ---
+
+def claim(worker_id, now=None):
+    """Забирает ближайшую готовую задачу или возвращает ``None``."""
+    now = now or datetime.now()
+    for _ in range(5):
+        job_id = db.session.scalar(
+            select(Job.id).where(Job.status == 'queued', Job.run_at <= now).order_by(Job.run_at, Job.id).limit(1)
+        )
+        if job_id is None:
+            db.session.rollback()
+            return None
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == 'queued')
+            .values(status='running', locked_by=worker_id, started_at=now, attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def run_job(job):
+    """Выполняет забранную задачу; возвращает ``True`` при успехе."""
+    job_id = job.id
+    try:
+        result = HANDLERS[job.kind](**json.loads(job.payload))
+    except Exception:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        now = datetime.now()
+        job.last_error = traceback.format_exc(limit=5)[-2000:]
+        job.locked_by = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = now
+        else:
+            job.status = 'queued'
+            job.run_at = now + timedelta(seconds=RETRY_BACKOFF * 2 ** (job.attempts - 1))
+        db.session.commit()
+        current_app.logger.warning('job %s (%s) failed, attempt %s/%s', job_id, job.kind,
+                                   job.attempts, job.max_attempts)
+        return False
+    job = db.session.get(Job, job_id)
+    job.status = 'done'
+    job.result = _dump(result)
+    job.finished_at = datetime.now()
+    db.session.commit()
+    return True
+
+
+def requeue_stale(now=None):
+    """Возвращает в очередь задачи, застрявшие в ``running`` (воркер умер)."""
+    now = now or datetime.now()
+    count = db.session.execute(
+        update(Job).where(Job.status == 'running', Job.started_at < now - STALE_AFTER)
+        .values(status='queued', locked_by=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def prune(now=None):
+    """Удаляет завершённые задачи старше ``KEEP_FINISHED``."""
+    now = now or datetime.now()
+    count = db.session.execute(
+        delete(Job).where(Job.status.in_(('done', 'failed')), Job.finished_at < now - KEEP_FINISHED)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def schedule_nightly(now=None):
+    """Ставит ночной пересчёт агрегатов на ближайшие ``NIGHTLY_AT``; раз в сутки благодаря ключу."""
+    now = now or datetime.now()
+    day = now.date() if now.time() < NIGHTLY_AT else now.date() + timedelta(days=1)
+    job = enqueue('rebuild_aggregates', key=f'nightly-aggregates:{day.isoformat()}',
+                  run_at=datetime.combine(day, NIGHTLY_AT))
+    db.session.commit()
+    return job
+
+
+def _work(app, worker_id, stop, poll):
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                job = claim(worker_id)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('job claim failed')
+                job = None
+            if job is None:
+                stop.wait(poll)
+                continue
+            run_job(job)
+            db.session.remove()
+
+
+def run_worker(app, threads=2, poll=1.0, once=False):
+    """Запускает потоки-исполнители; ``once`` — выполнить готовые задачи и выйти."""
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    if once:
+        with app.app_context():
+            done = 0
+            while (job := claim(worker_id)) is not None:
+                run_job(job)
+                done += 1
+            return done
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    pool = [threading.Thread(target=_work, args=(app, f'{worker_id}/{i}', stop, poll), daemon=True)
+            for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    try:
+        while not stop.is_set():
+            with app.app_context():
+                requeue_stale()
+                prune()
+                schedule_nightly()
+            stop.wait(HOUSEKEEPING_EVERY)
+    except KeyboardInterrupt:
+        stop.set()
+    for thread in pool:
+        thread.join()
+
+
+jobs_cli = AppGroup('jobs', help='Фоновые задачи.')
+
+
+@jobs_cli.command('worker')
+@click.option('--threads', type=int, default=None, help='Потоков-исполнителей (JOBS_THREADS)')
+@click.option('--poll', type=float, default=None, help='Пауза при пустой очереди, с')
+@click.option('--once', is_flag=True, help='Выполнить готовые задачи и выйти')
+def worker_command(threads, poll, once):
+    """Запустить воркер очереди задач."""
+    app = current_app._get_current_object()
+    threads = threads or app.config['JOBS_THREADS']
+    poll = poll or app.config['JOBS_POLL_INTERVAL']
+    if once:
+        click.echo(f'✅ Выполнено задач: {run_worker(app, once=True)}')
+        return
+    click.echo(f'Воркер запущен: {threads} потоков')
+    run_worker(app, threads=threads, poll=poll)
+
+
+@jobs_cli.command('status')
+def status_command():
+    """Сколько задач в каждом статусе и последние ошибки."""
+    for status, count in db.session.execute(select(Job.status, func.count(Job.id)).group_by(Job.status)):
+        click.echo(f'{status:>8}: {count}')
+    for job in db.session.scalars(select(Job).where(Job.status == 'failed').order_by(Job.id.desc()).limit(5)):
+        last_line = (job.last_error or '').strip().splitlines()[-1:] or ['']
+        click.echo(f'⚠️ #{job.id} {job.kind}: {last_line[0]}')
+
+
+@jobs_cli.command('enqueue')
+@click.argument('kind')
+@click.option('--payload', default='{}', help='JSON с аргументами обработчика')
+@click.option('--key', default=None, help='Ключ идемпотентности')
+def enqueue_command(kind, payload, key):
+    """Поставить задачу в очередь."""
+    try:
+        job = enqueue(kind, json.loads(payload), key=key)
+    except (JobError, ValueError) as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo(f'✅ #{job.id} {job.kind}: {job.status}')
+
+
+def init_jobs(app):
+    app.config.setdefault('JOBS_INLINE', False)
+    app.config.setdefault('JOBS_THREADS', 2)
+    app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+    app.cli.add_command(jobs_cli)
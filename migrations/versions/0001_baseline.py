@@ -0,0 +1,151 @@
+"""baseline schema
+
+Создаёт таблицы, если их ещё нет, и добирает колонки, которые раньше
+добавлялись вручную (student.group_id, teacher.stage_name). Поэтому
+применяется и к пустой БД, и к уже работающей studio.db.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _columns(inspector, table):
+    return {c['name'] for c in inspector.get_columns(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'user' not in tables:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.String(length=200), nullable=False),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('role', sa.String(length=20), nullable=False),
+            sa.PrimaryKeyConstraint('id', name='pk_user'),
+            sa.UniqueConstraint('email', name='uq_user_email'),
+        )
+    if 'direction' not in tables:
+        op.create_table(
+            'direction',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('photo', sa.String(length=200), nullable=True),
+            sa.PrimaryKeyConstraint('id', name='pk_direction'),
+        )
+    if 'teacher' not in tables:
+        op.create_table(
+            'teacher',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('bio', sa.Text(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('stage_name', sa.String(length=100), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_teacher_user_id_user'),
+            sa.PrimaryKeyConstraint('id', name='pk_teacher'),
+        )
+    elif 'stage_name' not in _columns(inspector, 'teacher'):
+        with op.batch_alter_table('teacher') as batch_op:
+            batch_op.add_column(sa.Column('stage_name', sa.String(length=100), nullable=True))
+    if 'group' not in tables:
+        op.create_table(
+            'group',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('direction_id', sa.Integer(), nullable=True),
+            sa.Column('teacher_id', sa.Integer(), nullable=True),
+            sa.Column('capacity', sa.Integer(), nullable=False),
+            sa.Column('location', sa.String(length=200), nullable=True),
+            sa.ForeignKeyConstraint(['direction_id'], ['direction.id'], name='fk_group_direction_id_direction'),
+            sa.ForeignKeyConstraint(['teacher_id'], ['teacher.id'], name='fk_group_teacher_id_teacher'),
+            sa.PrimaryKeyConstraint('id', name='pk_group'),
+        )
+    if 'student' not in tables:
+        op.create_table(
+            'student',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('phone', sa.String(length=50), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('group_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_student_user_id_user'),
+            sa.ForeignKeyConstraint(['group_id'], ['group.id'], name='fk_student_group_id_group'),
+            sa.PrimaryKeyConstraint('id', name='pk_student'),
+        )
+    elif 'group_id' not in _columns(inspector, 'student'):
+        with op.batch_alter_table('student') as batch_op:
+            batch_op.add_column(sa.Column('group_id', sa.Integer(), nullable=True))
+    if 'lesson' not in tables:
+        op.create_table(
+            'lesson',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('group_id', sa.Integer(), nullable=True),
+            sa.Column('start_dt', sa.DateTime(), nullable=False),
+            sa.Column('duration_minutes', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['group_id'], ['group.id'], name='fk_lesson_group_id_group'),
+            sa.PrimaryKeyConstraint('id', name='pk_lesson'),
+        )
+    if 'subscription' not in tables:
+        op.create_table(
+            'subscription',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=120), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('price', sa.Float(), nullable=False),
+            sa.Column('sessions', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id', name='pk_subscription'),
+        )
+    if 'abonement' not in tables:
+        op.create_table(
+            'abonement',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('price', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('id', name='pk_abonement'),
+        )
+    if 'booking' not in tables:
+        op.create_table(
+            'booking',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('student_name', sa.String(length=100), nullable=False),
+            sa.Column('direction_id', sa.Integer(), nullable=False),
+            sa.Column('teacher_id', sa.Integer(), nullable=False),
+            sa.Column('attended', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('lesson_id', sa.Integer(), nullable=True),
+            sa.Column('student_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['direction_id'], ['direction.id'], name='fk_booking_direction_id_direction'),
+            sa.ForeignKeyConstraint(['teacher_id'], ['teacher.id'], name='fk_booking_teacher_id_teacher'),
+            sa.PrimaryKeyConstraint('id', name='pk_booking'),
+        )
+    if 'payment' not in tables:
+        op.create_table(
+            'payment',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('student_id', sa.Integer(), nullable=True),
+            sa.Column('amount', sa.Float(), nullable=False),
+            sa.Column('note', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['student_id'], ['student.id'], name='fk_payment_student_id_student'),
+            sa.PrimaryKeyConstraint('id', name='pk_payment'),
+        )
+
+
+def downgrade():
+    for table in ('payment', 'booking', 'abonement', 'subscription', 'lesson',
+                  'student', 'group', 'teacher', 'direction', 'user'):
+        op.drop_table(table)
@@ -0,0 +1,59 @@
+"""booking integrity and lesson seat counter
+
+Пересобирает booking (batch) с NOT NULL и внешними ключами на lesson и
+student, удаляет повторные записи студента на урок (остаётся самая ранняя)
+и добавляет уникальный индекс (lesson_id, student_id), счётчик
+lesson.seats_taken с пересчётом по существующим записям и индекс
+расписания (start_dt, group_id).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+# повторы остались от записи без уникального индекса; оставляем первую
+DEDUPE = '''
+DELETE FROM booking
+WHERE id NOT IN (SELECT min(id) FROM booking GROUP BY lesson_id, student_id)
+'''
+
+
+def upgrade():
+    op.execute(DEDUPE)
+    with op.batch_alter_table('booking', recreate='always') as batch_op:
+        batch_op.alter_column('lesson_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('student_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_booking_lesson_id_lesson', 'lesson', ['lesson_id'], ['id'])
+        batch_op.create_foreign_key('fk_booking_student_id_student', 'student', ['student_id'], ['id'])
+    op.create_index('uq_booking_lesson_student', 'booking', ['lesson_id', 'student_id'], unique=True)
+
+    with op.batch_alter_table('lesson') as batch_op:
+        batch_op.add_column(sa.Column('seats_taken', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        'UPDATE lesson SET seats_taken = '
+        '(SELECT count(*) FROM booking WHERE booking.lesson_id = lesson.id)'
+    )
+    op.create_index('ix_lesson_start_dt_group_id', 'lesson', ['start_dt', 'group_id'])
+
+
+def downgrade():
+    op.drop_index('ix_lesson_start_dt_group_id', table_name='lesson')
+    with op.batch_alter_table('lesson') as batch_op:
+        batch_op.drop_column('seats_taken')
+    op.drop_index('uq_booking_lesson_student', table_name='booking')
+    with op.batch_alter_table('booking', recreate='always') as batch_op:
+        batch_op.drop_constraint('fk_booking_student_id_student', type_='foreignkey')
+        batch_op.drop_constraint('fk_booking_lesson_id_lesson', type_='foreignkey')
+        batch_op.alter_column('student_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('lesson_id', existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,101 @@
+"""materialized dashboard statistics
+
+Таблицы заполняются по существующим данным тем же расчётом, что и
+``flask rebuild-stats``, иначе инкрементальные изменения копились бы от нуля.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL_COUNTERS = '''
+INSERT INTO stat_counter (name, value)
+SELECT 'students', count(*) FROM student
+UNION ALL SELECT 'teachers', count(*) FROM teacher
+UNION ALL SELECT 'directions', count(*) FROM direction
+UNION ALL SELECT 'payments', count(*) FROM payment
+UNION ALL SELECT 'revenue', COALESCE(sum(amount), 0) FROM payment
+UNION ALL SELECT 'bookings', count(*) FROM booking
+UNION ALL SELECT 'attended', COALESCE(sum(CASE WHEN attended THEN 1 ELSE 0 END), 0) FROM booking
+'''
+
+BACKFILL_DAYS = '''
+INSERT INTO daily_stats (day, lessons, seats, bookings, attended, payments, revenue)
+SELECT day, sum(lessons), sum(seats), sum(bookings), sum(attended), sum(payments), sum(revenue)
+FROM (
+    SELECT date(l.start_dt) AS day, 1 AS lessons, COALESCE(g.capacity, 0) AS seats,
+           0 AS bookings, 0 AS attended, 0 AS payments, 0 AS revenue
+    FROM lesson l LEFT JOIN "group" g ON g.id = l.group_id
+    UNION ALL
+    SELECT date(l.start_dt), 0, 0, 1, CASE WHEN b.attended THEN 1 ELSE 0 END, 0, 0
+    FROM booking b JOIN lesson l ON l.id = b.lesson_id
+    UNION ALL
+    SELECT date(p.created_at), 0, 0, 0, 0, 1, p.amount
+    FROM payment p
+) AS t
+WHERE day IS NOT NULL
+GROUP BY day
+'''
+
+BACKFILL_GROUPS = '''
+INSERT INTO group_stats (group_id, lessons, seats, bookings, attended)
+SELECT group_id, sum(lessons), sum(seats), sum(bookings), sum(attended)
+FROM (
+    SELECT g.id AS group_id, 1 AS lessons, g.capacity AS seats, 0 AS bookings, 0 AS attended
+    FROM lesson l JOIN "group" g ON g.id = l.group_id
+    UNION ALL
+    SELECT g.id, 0, 0, 1, CASE WHEN b.attended THEN 1 ELSE 0 END
+    FROM booking b JOIN lesson l ON l.id = b.lesson_id JOIN "group" g ON g.id = l.group_id
+) AS t
+GROUP BY group_id
+'''
+
+
+def upgrade():
+    op.create_table(
+        'stat_counter',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('name', name='pk_stat_counter'),
+    )
+    op.create_table(
+        'daily_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('lessons', sa.Integer(), nullable=False),
+        sa.Column('seats', sa.Integer(), nullable=False),
+        sa.Column('bookings', sa.Integer(), nullable=False),
+        sa.Column('attended', sa.Integer(), nullable=False),
+        sa.Column('payments', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', name='pk_daily_stats'),
+    )
+    op.create_table(
+        'group_stats',
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('lessons', sa.Integer(), nullable=False),
+        sa.Column('seats', sa.Integer(), nullable=False),
+        sa.Column('bookings', sa.Integer(), nullable=False),
+        sa.Column('attended', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id'], name='fk_group_stats_group_id_group'),
+        sa.PrimaryKeyConstraint('group_id', name='pk_group_stats'),
+    )
+    op.execute(BACKFILL_COUNTERS)
+    op.execute(BACKFILL_DAYS)
+    op.execute(BACKFILL_GROUPS)
+
+
+def downgrade():
+    op.drop_table('group_stats')
+    op.drop_table('daily_stats')
+    op.drop_table('stat_counter')
@@ -0,0 +1,35 @@
+"""indexes for the app's query patterns
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:30:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = (
+    ('ix_booking_student_id', 'booking', ['student_id']),
+    ('ix_lesson_group_id', 'lesson', ['group_id']),
+    ('ix_payment_student_id_created_at', 'payment', ['student_id', 'created_at']),
+    ('ix_student_user_id', 'student', ['user_id']),
+    ('ix_teacher_user_id', 'teacher', ['user_id']),
+    ('ix_group_teacher_id', 'group', ['teacher_id']),
+)
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,37 @@
+"""lesson waitlist
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'waitlist_entry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('lesson_id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['lesson_id'], ['lesson.id'], name='fk_waitlist_entry_lesson_id_lesson'),
+        sa.ForeignKeyConstraint(['student_id'], ['student.id'], name='fk_waitlist_entry_student_id_student'),
+        sa.PrimaryKeyConstraint('id', name='pk_waitlist_entry'),
+    )
+    with op.batch_alter_table('waitlist_entry', schema=None) as batch_op:
+        batch_op.create_index('uq_waitlist_entry_lesson_student', ['lesson_id', 'student_id'], unique=True)
+        batch_op.create_index('ix_waitlist_entry_lesson_id_id', ['lesson_id', 'id'], unique=False)
+        batch_op.create_index('ix_waitlist_entry_student_id', ['student_id'], unique=False)
+
+
+def downgrade():
+    op.drop_table('waitlist_entry')
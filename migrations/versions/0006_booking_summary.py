@@ -0,0 +1,58 @@
+"""booking summary read model for /me
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL = '''
+INSERT INTO booking_summary (booking_id, student_id, lesson_id, start_dt, duration_minutes, group_id,
+                             group_name, direction_name, teacher_name, location, attended)
+SELECT b.id, b.student_id, b.lesson_id, l.start_dt, l.duration_minutes, l.group_id,
+       g.name, d.name, u.name, g.location, COALESCE(b.attended, false)
+FROM booking b
+JOIN lesson l ON l.id = b.lesson_id
+LEFT JOIN "group" g ON g.id = l.group_id
+LEFT JOIN direction d ON d.id = g.direction_id
+LEFT JOIN teacher t ON t.id = g.teacher_id
+LEFT JOIN "user" u ON u.id = t.user_id
+'''
+
+
+def upgrade():
+    op.create_table(
+        'booking_summary',
+        sa.Column('booking_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('lesson_id', sa.Integer(), nullable=False),
+        sa.Column('start_dt', sa.DateTime(), nullable=False),
+        sa.Column('duration_minutes', sa.Integer(), nullable=True),
+        sa.Column('group_id', sa.Integer(), nullable=True),
+        sa.Column('group_name', sa.String(length=120), nullable=True),
+        sa.Column('direction_name', sa.String(length=120), nullable=True),
+        sa.Column('teacher_name', sa.String(length=120), nullable=True),
+        sa.Column('location', sa.String(length=200), nullable=True),
+        sa.Column('attended', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('booking_id', name='pk_booking_summary'),
+    )
+    with op.batch_alter_table('booking_summary', schema=None) as batch_op:
+        batch_op.create_index('ix_booking_summary_student_id_start_dt', ['student_id', 'start_dt', 'booking_id'],
+                              unique=False)
+        batch_op.create_index('ix_booking_summary_lesson_id', ['lesson_id'], unique=False)
+        batch_op.create_index('ix_booking_summary_group_id', ['group_id'], unique=False)
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_table('booking_summary')
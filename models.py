@@ -0,0 +1,210 @@
+from datetime import datetime, timezone
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import MetaData
+from werkzeug.security import check_password_hash
+
+
+# Явные имена ограничений нужны Alembic, чтобы пересобирать таблицы SQLite в batch-режиме
+db = SQLAlchemy(metadata=MetaData(naming_convention={
+    'ix': 'ix_%(column_0_label)s',
+    'uq': 'uq_%(table_name)s_%(column_0_name)s',
+    'ck': 'ck_%(table_name)s_%(constraint_name)s',
+    'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s',
+    'pk': 'pk_%(table_name)s',
+}))
+
+
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(200), nullable=False)
+    name = db.Column(db.String(120), nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+    teacher = db.relationship('Teacher', uselist=False, back_populates='user')
+    student = db.relationship('Student', uselist=False, back_populates='user')
+
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+
+
+class Direction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    photo = db.Column(db.String(200), nullable=True)
+    groups = db.relationship('Group', back_populates='direction')
+
+
+class Teacher(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    bio = db.Column(db.Text)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    user = db.relationship('User', back_populates='teacher')
+    groups = db.relationship('Group', back_populates='teacher')
+    stage_name = db.Column(db.String(100), nullable=True)
+
+
+class Student(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    phone = db.Column(db.String(50))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    user = db.relationship('User', back_populates='student')
+    tablename = 'student'
+    bookings = db.relationship('Booking', back_populates='student', cascade='all, delete-orphan')
+    payments = db.relationship('Payment', back_populates='student')
+    group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=True)
+    group = db.relationship('Group', back_populates='students')
+
+
+class Group(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    direction_id = db.Column(db.Integer, db.ForeignKey('direction.id'))
+    direction = db.relationship('Direction', back_populates='groups')
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), index=True)
+    teacher = db.relationship('Teacher', back_populates='groups')
+    capacity = db.Column(db.Integer, nullable=False, default=12)
+    location = db.Column(db.String(200), nullable=True)
+    lessons = db.relationship('Lesson', back_populates='group')
+    students = db.relationship('Student', back_populates='group')
+
+
+class Lesson(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('group.id'), index=True)
+    group = db.relationship('Group', back_populates='lessons')
+    start_dt = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, default=60)
+    seats_taken = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bookings = db.relationship('Booking', back_populates='lesson')
+
+    __table_args__ = (
+        db.Index('ix_lesson_start_dt_group_id', 'start_dt', 'group_id'),
+    )
+
+
+class Subscription(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(120), nullable=False)
+    description = db.Column(db.Text)
+    price = db.Column(db.Float, nullable=False, default=0.0)
+    sessions = db.Column(db.Integer, nullable=False, default=1)
+
+
+class Abonement(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    description = db.Column(db.Text)
+    price = db.Column(db.Float, nullable=False)
+
+class Booking(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    student_name = db.Column(db.String(100), nullable=False)
+    direction_id = db.Column(db.Integer, db.ForeignKey('direction.id'), nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
+    attended = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    tablename = 'booking'
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
+    lesson = db.relationship('Lesson', back_populates='bookings')
+
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False, index=True)
+    student = db.relationship('Student', back_populates='bookings')
+
+    __table_args__ = (
+        db.Index('uq_booking_lesson_student', 'lesson_id', 'student_id', unique=True),
+    )
+
+
+class BookingSummary(db.Model):
+    """Плоская копия записи для /me; поддерживается модулем ``timeline``."""
+    booking_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    student_id = db.Column(db.Integer, nullable=False)
+    lesson_id = db.Column(db.Integer, nullable=False, index=True)
+    start_dt = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer)
+    group_id = db.Column(db.Integer, index=True)
+    group_name = db.Column(db.String(120))
+    direction_name = db.Column(db.String(120))
+    teacher_name = db.Column(db.String(120))
+    location = db.Column(db.String(200))
+    attended = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('ix_booking_summary_student_id_start_dt', 'student_id', 'start_dt', 'booking_id'),
+    )
+
+
+class WaitlistEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
+    lesson = db.relationship('Lesson')
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False, index=True)
+    student = db.relationship('Student')
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # очередь урока по порядку id; заодно не даёт встать в неё дважды
+        db.Index('uq_waitlist_entry_lesson_student', 'lesson_id', 'student_id', unique=True),
+        db.Index('ix_waitlist_entry_lesson_id_id', 'lesson_id', 'id'),
+    )
+
+
+class Payment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'))
+    student = db.relationship('Student', back_populates='payments')
+    amount = db.Column(db.Float, nullable=False)
+    note = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.Index('ix_payment_student_id_created_at', 'student_id', 'created_at'),
+    )
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False)
+    idempotency_key = db.Column(db.String(200), unique=True, nullable=True)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+
+class StatCounter(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+
+
+class DailyStats(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    lessons = db.Column(db.Integer, nullable=False, default=0)
+    seats = db.Column(db.Integer, nullable=False, default=0)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    attended = db.Column(db.Integer, nullable=False, default=0)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class GroupStats(db.Model):
+    group_id = db.Column(db.Integer, db.ForeignKey('group.id'), primary_key=True)
+    group = db.relationship('Group')
+    lessons = db.Column(db.Integer, nullable=False, default=0)
+    seats = db.Column(db.Integer, nullable=False, default=0)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    attended = db.Column(db.Integer, nullable=False, default=0)
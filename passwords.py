@@ -0,0 +1,46 @@
+"""Хэши паролей по политике ``PASSWORD_HASH_METHOD``.
+
+Метод — строка Werkzeug: ``scrypt:32768:8:1`` (по умолчанию, как у
+``generate_password_hash``) или, например, ``pbkdf2:sha256:600000``. При
+входе ``verify`` сверяет параметры сохранённого хэша с политикой и, если
+они устарели, пересчитывает хэш — открытый пароль в этот момент известен.
+Так смена политики доходит до всех, кто входит, без сброса паролей.
+"""
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import generate_password_hash
+
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+def policy_method():
+    return current_app.config['PASSWORD_HASH_METHOD']
+
+
+def hash_password(password, method=None):
+    return generate_password_hash(password, method=method or policy_method())
+
+
+@lru_cache(maxsize=8)
+def _canonical(method):
+    # Werkzeug дописывает параметры по умолчанию (``pbkdf2`` -> ``pbkdf2:sha256:1000000``)
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash, method=None):
+    return password_hash.split('$', 1)[0] != _canonical(method or policy_method())
+
+
+def verify(user, password):
+    """Проверяет пароль; устаревший хэш пересчитывает (коммитит вызывающий код)."""
+    if not user.check_password(password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+    return True
+
+
+def init_passwords(app):
+    app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
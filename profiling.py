@@ -0,0 +1,221 @@
+"""Профилирование запросов: время, шаблоны, SQL (включается ``PROFILING``).
+
+Для каждого запроса считаются полное время, время рендера шаблонов и SQL:
+число выражений, их суммарное время и самые медленные. Итоги уходят в
+заголовок ``Server-Timing`` (видно во вкладке Network браузера), в метрики
+``/admin/metrics`` (текстовый формат Prometheus) и, если запрос дольше
+``PROFILING_SLOW_MS``, в лог. Доля запросов ``PROFILING_SAMPLE_RATE``
+выполняется под cProfile; медленные из них сохраняются в ``PROFILING_DIR``
+(``python -m pstats file.prof``).
+
+Когда ``PROFILING`` выключен, ни хуки запроса, ни события движка и сигналы
+шаблонов не регистрируются — накладных расходов нет.
+"""
+import cProfile
+import heapq
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, has_app_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOWEST_STATEMENTS = 3
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.slowest = []  # heap (elapsed, statement)
+        self.template_time = 0.0
+        self.template_stack = []
+        self.profiler = None
+
+    def add_statement(self, statement, elapsed):
+        self.sql_count += 1
+        self.sql_time += elapsed
+        item = (elapsed, ' '.join(statement.split())[:300])
+        if len(self.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+    def slowest_statements(self):
+        return sorted(self.slowest, reverse=True)
+
+
+class Metrics:
+    """Накопительные метрики по endpoint; потокобезопасно."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.slow_requests = 0
+
+    def observe(self, endpoint, status, elapsed, profile):
+        with self._lock:
+            route = self._routes.get(endpoint)
+            if route is None:
+                route = self._routes[endpoint] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0, 'errors': 0,
+                    'sql_count': 0, 'sql_time': 0.0, 'template_time': 0.0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if elapsed <= bound:
+                    route['buckets'][i] += 1
+            route['count'] += 1
+            route['sum'] += elapsed
+            route['errors'] += status >= 500
+            route['sql_count'] += profile.sql_count
+            route['sql_time'] += profile.sql_time
+            route['template_time'] += profile.template_time
+
+    def observe_slow(self):
+        with self._lock:
+            self.slow_requests += 1
+
+    def render(self):
+        """Текстовый формат Prometheus (exposition format 0.0.4)."""
+        with self._lock:
+            routes = {name: dict(route, buckets=list(route['buckets'])) for name, route in self._routes.items()}
+            slow = self.slow_requests
+        lines = [
+            '# HELP studio_request_duration_seconds Request wall time.',
+            '# TYPE studio_request_duration_seconds histogram',
+        ]
+        for name, route in sorted(routes.items()):
+            for bound, count in zip(self.buckets, route['buckets']):
+                lines.append(f'studio_request_duration_seconds_bucket{{endpoint="{name}",le="{bound}"}} {count}')
+            lines.append(f'studio_request_duration_seconds_bucket{{endpoint="{name}",le="+Inf"}} {route["count"]}')
+            lines.append(f'studio_request_duration_seconds_sum{{endpoint="{name}"}} {route["sum"]:.6f}')
+            lines.append(f'studio_request_duration_seconds_count{{endpoint="{name}"}} {route["count"]}')
+        for metric, key, kind, help_text in (
+            ('studio_request_errors_total', 'errors', 'counter', 'Responses with status >= 500.'),
+            ('studio_sql_queries_total', 'sql_count', 'counter', 'SQL statements executed.'),
+            ('studio_sql_duration_seconds_total', 'sql_time', 'counter', 'Time spent in SQL statements.'),
+            ('studio_template_duration_seconds_total', 'template_time', 'counter', 'Time spent rendering templates.'),
+        ):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, route in sorted(routes.items()):
+                value = route[key]
+                lines.append(f'{metric}{{endpoint="{name}"}} {value:.6f}' if isinstance(value, float)
+                             else f'{metric}{{endpoint="{name}"}} {value}')
+        lines += [
+            '# HELP studio_slow_requests_total Requests slower than PROFILING_SLOW_MS.',
+            '# TYPE studio_slow_requests_total counter',
+            f'studio_slow_requests_total {slow}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def _current_profile():
+    return g.get('_profile') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._profiling_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_profiling_started', None)
+    profile = _current_profile()
+    if profile is not None and started is not None:
+        profile.add_statement(statement, time.perf_counter() - started)
+
+
+def _template_started(sender, template, context, **extra):
+    profile = _current_profile()
+    if profile is not None:
+        profile.template_stack.append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    profile = _current_profile()
+    if profile is not None and profile.template_stack:
+        started = profile.template_stack.pop()
+        if not profile.template_stack:
+            profile.template_time += time.perf_counter() - started
+
+
+def server_timing(profile, elapsed):
+    return (f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={profile.sql_time * 1000:.1f};desc="{profile.sql_count} queries", '
+            f'tpl;dur={profile.template_time * 1000:.1f}')
+
+
+def _dump_profile(app, profile, endpoint):
+    directory = app.config['PROFILING_DIR'] or os.path.join(app.instance_path, 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{datetime.now():%Y%m%d-%H%M%S-%f}-{endpoint}.prof')
+    profile.profiler.dump_stats(path)
+    return path
+
+
+def init_profiling(app):
+    app.config.setdefault('PROFILING', False)
+    app.config.setdefault('PROFILING_SLOW_MS', 500)
+    app.config.setdefault('PROFILING_SAMPLE_RATE', 0.01)
+    app.config.setdefault('PROFILING_DIR', None)
+    app.config.setdefault('PROFILING_METRICS_TOKEN', None)
+    if not app.config['PROFILING']:
+        return
+
+    metrics = app.extensions['profiling'] = Metrics()
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+    @app.before_request
+    def _start_profile():
+        profile = g._profile = RequestProfile()
+        if random.random() < app.config['PROFILING_SAMPLE_RATE']:
+            profile.profiler = cProfile.Profile()
+            profile.profiler.enable()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return response
+        if profile.profiler is not None:
+            profile.profiler.disable()
+        elapsed = time.perf_counter() - profile.started
+        endpoint = request.endpoint or 'unknown'
+        response.headers['Server-Timing'] = server_timing(profile, elapsed)
+        metrics.observe(endpoint, response.status_code, elapsed, profile)
+
+        if elapsed * 1000 >= app.config['PROFILING_SLOW_MS']:
+            metrics.observe_slow()
+            dump = _dump_profile(app, profile, endpoint) if profile.profiler is not None else None
+            slowest = '; '.join(f'{t * 1000:.1f}ms {sql}' for t, sql in profile.slowest_statements())
+            app.logger.warning(
+                'slow request %s %s: %.0fms, sql %d/%.0fms, templates %.0fms%s | %s',
+                request.method, request.full_path.rstrip('?'), elapsed * 1000, profile.sql_count,
+                profile.sql_time * 1000, profile.template_time * 1000,
+                f', profile {dump}' if dump else '', slowest,
+            )
+        return response
+
+    @app.teardown_request
+    def _drop_profile(exc):
+        # after_request не вызывается при необработанном исключении
+        profile = g.pop('_profile', None)
+        if profile is not None and profile.profiler is not None:
+            profile.profiler.disable()
+
+
+def metrics():
+    """``Metrics`` приложения или ``None``, если профилирование выключено."""
+    return current_app.extensions.get('profiling')
@@ -0,0 +1,199 @@
+"""Планы загрузки связей для страниц-списков и счётчик SQL-запросов.
+
+Шаблоны обходят цепочки вроде ``l.group.direction.name`` и
+``s.bookings -> b.lesson.group.direction``; без явного плана каждая такая
+цепочка превращается в отдельный запрос на строку (N+1). Каждая view берёт
+готовый план отсюда, а счётчик запросов позволяет проверить, что число
+запросов на страницу не растёт вместе с данными.
+"""
+import base64
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import g, has_app_context
+from sqlalchemy import and_, event, or_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import Booking, Group, Lesson, Student, Teacher
+
+
+# Lesson -> Group -> Direction / Teacher -> User (lessons.html, teacher_detail.html)
+LESSON_CARD = (
+    joinedload(Lesson.group).joinedload(Group.direction),
+    joinedload(Lesson.group).joinedload(Group.teacher).joinedload(Teacher.user),
+)
+
+# Group -> Direction / Teacher -> User (groups.html, lesson_form.html)
+GROUP_ROW = (
+    joinedload(Group.direction),
+    joinedload(Group.teacher).joinedload(Teacher.user),
+)
+
+# Teacher -> User (teachers.html, group_form.html)
+TEACHER_CARD = (
+    joinedload(Teacher.user),
+)
+
+# lesson_detail.html: карточка урока плюс список записанных студентов
+LESSON_DETAIL = LESSON_CARD + (
+    selectinload(Lesson.bookings).joinedload(Booking.student).joinedload(Student.user),
+)
+
+# Booking -> Lesson -> Group -> Direction (student_profile.html)
+STUDENT_BOOKING_ROW = (
+    joinedload(Booking.lesson).joinedload(Lesson.group).joinedload(Group.direction),
+)
+
+# Student -> User / Group, Student -> Bookings -> Lesson -> Group -> Direction (admin_students.html)
+ADMIN_STUDENT_ROW = (
+    joinedload(Student.user),
+    joinedload(Student.group),
+    selectinload(Student.bookings)
+    .joinedload(Booking.lesson)
+    .joinedload(Lesson.group)
+    .joinedload(Group.direction),
+)
+
+
+_active_counters = []
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+    for counter in _active_counters:
+        counter.append(statement)
+
+
+def query_count():
+    """Количество SQL-запросов, выполненных в текущем запросе (app context)."""
+    return g.get('query_count', 0)
+
+
+@contextmanager
+def count_queries():
+    """Собирает выполненные внутри блока SQL-выражения.
+
+    >>> with count_queries() as statements:
+    ...     client.get('/lessons')
+    >>> assert len(statements) <= 3
+    """
+    statements = []
+    _active_counters.append(statements)
+    try:
+        yield statements
+    finally:
+        _active_counters.remove(statements)
+
+
+def init_query_counter(app):
+    """При ``QUERY_COUNT_HEADER`` добавляет к ответам заголовок ``X-Query-Count``."""
+    app.config.setdefault('QUERY_COUNT_HEADER', False)
+
+    @app.after_request
+    def _query_count_header(response):
+        if app.config['QUERY_COUNT_HEADER']:
+            response.headers['X-Query-Count'] = str(query_count())
+        return response
+
+
+LESSON_PAGE_SIZE = 50
+MAX_LESSON_PAGE_SIZE = 200
+
+LessonPage = namedtuple('LessonPage', 'items next_cursor')
+
+
+def encode_cursor(lesson):
+    return encode_key(lesson.start_dt, lesson.id)
+
+
+def encode_key(dt, row_id):
+    """Курсор ``(datetime, id)`` для keyset-пагинации; читается ``decode_cursor``."""
+    raw = f'{dt.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        dt, lid = raw.split('|')
+        return datetime.fromisoformat(dt), int(lid)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('invalid cursor') from e
+
+
+def lesson_window(window, anchor=None):
+    """Границы окна ``week``/``month``, начинающегося с недели/месяца ``anchor``."""
+    anchor = anchor or datetime.now()
+    day = anchor.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if window == 'month':
+        start = day.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    raise ValueError(f'unknown window: {window}')
+
+
+def lesson_filters_from_args(args):
+    """Разбирает фильтры расписания из query string; ``ValueError`` при мусоре."""
+    filters = {}
+    anchor = datetime.fromisoformat(args['date']) if args.get('date') else None
+    if args.get('window'):
+        filters['start'], filters['end'] = lesson_window(args['window'], anchor)
+    elif anchor:
+        filters['start'] = anchor
+    for name in ('direction_id', 'teacher_id', 'group_id'):
+        if args.get(name):
+            filters[name] = int(args[name])
+    if args.get('cursor'):
+        filters['after'] = decode_cursor(args['cursor'])
+    if args.get('limit'):
+        filters['limit'] = max(1, min(int(args['limit']), MAX_LESSON_PAGE_SIZE))
+    return filters
+
+
+def lesson_page(after=None, limit=LESSON_PAGE_SIZE, start=None, end=None,
+                direction_id=None, teacher_id=None, group_id=None, options=LESSON_CARD):
+    """Страница расписания с keyset-пагинацией по ``(start_dt, id)``.
+
+    Без ``start`` отдаются только будущие уроки. ``after`` — пара
+    ``(start_dt, id)`` последнего урока предыдущей страницы.
+    """
+    q = Lesson.query.options(*options)
+    q = q.filter(Lesson.start_dt >= (start or datetime.now()))
+    if end is not None:
+        q = q.filter(Lesson.start_dt < end)
+    if group_id is not None:
+        q = q.filter(Lesson.group_id == group_id)
+    if direction_id is not None or teacher_id is not None:
+        groups = select(Group.id)
+        if direction_id is not None:
+            groups = groups.where(Group.direction_id == direction_id)
+        if teacher_id is not None:
+            groups = groups.where(Group.teacher_id == teacher_id)
+        q = q.filter(Lesson.group_id.in_(groups))
+    if after is not None:
+        after_dt, after_id = after
+        q = q.filter(or_(Lesson.start_dt > after_dt,
+                         and_(Lesson.start_dt == after_dt, Lesson.id > after_id)))
+    rows = q.order_by(Lesson.start_dt, Lesson.id).limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return LessonPage(items, next_cursor)
+
+
+def lesson_to_dict(lesson):
+    group = lesson.group
+    return {
+        'id': lesson.id,
+        'start_dt': lesson.start_dt.isoformat(),
+        'duration_minutes': lesson.duration_minutes,
+        'group': {'id': group.id, 'name': group.name, 'location': group.location} if group else None,
+        'direction': {'id': group.direction.id, 'name': group.direction.name} if group and group.direction else None,
+        'teacher': {'id': group.teacher.id, 'name': group.teacher.user.name}
+        if group and group.teacher and group.teacher.user else None,
+    }
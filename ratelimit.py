@@ -0,0 +1,157 @@
+"""Ограничение частоты попыток входа: token bucket на IP и на email.
+
+У каждого ключа (``ip:1.2.3.4``, ``email:a@b``) есть «ведро» на ``burst``
+попыток, которое пополняется со скоростью ``per_minute``. Проверка идёт до
+поиска пользователя и хэширования пароля, поэтому подбор паролей упирается в
+дешёвый ответ 429, а не в CPU воркеров.
+
+Состояние хранится в SQLite-файле рядом с БД (``RATELIMIT_STORE=sqlite``),
+общем для всех воркеров gunicorn; ``memory`` — только внутри процесса.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import closing
+
+from flask import current_app
+
+
+Decision = namedtuple('Decision', 'allowed retry_after key')
+Rule = namedtuple('Rule', 'prefix burst per_minute')
+
+PRUNE_EVERY = 1000  # попыток между чистками полных вёдер
+
+
+def _refill(tokens, updated, now, rule):
+    return min(rule.burst, tokens + (now - updated) * rule.per_minute / 60)
+
+
+def _take(tokens, rule):
+    """Новое число жетонов и ``retry_after`` (0 — попытка разрешена)."""
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) * 60 / rule.per_minute
+
+
+class MemoryStore:
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rule, now):
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (rule.burst, now))
+            tokens, retry_after = _take(_refill(tokens, updated, now, rule), rule)
+            self._buckets[key] = (tokens, now)
+            return retry_after
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def prune(self, before):
+        with self._lock:
+            self._buckets = {k: v for k, v in self._buckets.items() if v[1] >= before}
+
+
+class SQLiteStore:
+    """Вёдра в отдельном SQLite-файле; одно соединение на поток."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS bucket '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # соединение, открытое до fork воркера gunicorn, в дочернем процессе не годится
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.pid = os.getpid()
+            conn.execute('PRAGMA journal_mode=WAL')
+            # потеря пары последних попыток при падении машины не страшна
+            conn.execute('PRAGMA synchronous=OFF')
+        return conn
+
+    def take(self, key, rule, now):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (rule.burst, now)
+            tokens, retry_after = _take(_refill(tokens, updated, now, rule), rule)
+            conn.execute('INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return retry_after
+
+    def reset(self, key):
+        self._connect().execute('DELETE FROM bucket WHERE key = ?', (key,))
+
+    def prune(self, before):
+        self._connect().execute('DELETE FROM bucket WHERE updated < ?', (before,))
+
+
+class Limiter:
+    def __init__(self, store, rules):
+        self.store = store
+        self.rules = rules
+        self._checks = 0
+        # за это время любое ведро пополняется до полного
+        self._full_after = max(rule.burst * 60 / rule.per_minute for rule in rules)
+
+    def check(self, **values):
+        """Берёт по жетону из вёдер ``rules`` по порядку; на первом пустом — отказ."""
+        now = time.time()
+        self._checks += 1
+        if self._checks % PRUNE_EVERY == 0:
+            self.store.prune(now - self._full_after)
+        for rule in self.rules:
+            value = values.get(rule.prefix)
+            if not value:
+                continue
+            key = f'{rule.prefix}:{value}'
+            retry_after = self.store.take(key, rule, now)
+            if retry_after:
+                return Decision(False, retry_after, key)
+        return Decision(True, 0.0, None)
+
+    def reset(self, **values):
+        for rule in self.rules:
+            if values.get(rule.prefix):
+                self.store.reset(f'{rule.prefix}:{values[rule.prefix]}')
+
+
+def _make_store(app):
+    kind = app.config['RATELIMIT_STORE']
+    if kind == 'memory':
+        return MemoryStore()
+    if kind == 'sqlite':
+        os.makedirs(app.instance_path, exist_ok=True)
+        return SQLiteStore(app.config['RATELIMIT_DB'] or os.path.join(app.instance_path, 'ratelimit.db'))
+    raise ValueError(f'unknown RATELIMIT_STORE: {kind}')
+
+
+def init_ratelimit(app):
+    app.config.setdefault('LOGIN_RATE_LIMIT', True)
+    app.config.setdefault('LOGIN_IP_BURST', 20)
+    app.config.setdefault('LOGIN_IP_PER_MINUTE', 10)
+    app.config.setdefault('LOGIN_EMAIL_BURST', 5)
+    app.config.setdefault('LOGIN_EMAIL_PER_MINUTE', 2)
+    app.config.setdefault('RATELIMIT_STORE', 'sqlite')
+    app.config.setdefault('RATELIMIT_DB', None)
+    app.extensions['login_limiter'] = Limiter(_make_store(app), (
+        Rule('ip', app.config['LOGIN_IP_BURST'], app.config['LOGIN_IP_PER_MINUTE']),
+        Rule('email', app.config['LOGIN_EMAIL_BURST'], app.config['LOGIN_EMAIL_PER_MINUTE']),
+    ))
+
+
+def login_limiter():
+    return current_app.extensions['login_limiter']
@@ -0,0 +1,180 @@
+"""Расписание: серии уроков и проверка накладок.
+
+Серия — еженедельное правило (дни недели, время, до какой даты, кроме
+праздников), которое ``expand_weekly`` разворачивает в слоты. Перед
+вставкой ``find_conflicts`` ищет пересечения по преподавателю и по залу
+(``Group.location``): существующие уроки из нужного окна загружаются одним
+запросом и раскладываются в ``IntervalIndex`` — отсортированные интервалы
+на каждого преподавателя/зал, поиск пересечений через bisect. Слоты самой
+серии тоже попадают в индекс, так что накладки внутри серии видны сразу.
+``create_lessons`` вставляет слоты одним executemany.
+
+Длительность урока ограничена ``MAX_LESSON_MINUTES``: поэтому окно поиска
+начинается не раньше чем за столько же до первого слота.
+"""
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert, or_, select
+
+import cache
+import stats
+from models import db, Group, Lesson
+
+
+WEEKDAYS = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс')
+MAX_SERIES_LESSONS = 1000
+MAX_LESSON_MINUTES = 12 * 60
+
+Slot = namedtuple('Slot', 'group_id start_dt duration_minutes')
+# other_lesson_id is None — пересечение со слотом этой же серии
+Conflict = namedtuple('Conflict', 'slot kind resource other_start other_end other_lesson_id other_group_id')
+
+
+class SchedulingError(Exception):
+    pass
+
+
+def slot_end(slot):
+    return slot.start_dt + timedelta(minutes=slot.duration_minutes or 60)
+
+
+def check_duration(minutes):
+    if not 0 < minutes <= MAX_LESSON_MINUTES:
+        raise SchedulingError(f'длительность урока — от 1 до {MAX_LESSON_MINUTES} минут')
+    return minutes
+
+
+def parse_holidays(text):
+    """Даты ``YYYY-MM-DD`` через пробел, запятую или с новой строки."""
+    holidays = set()
+    for token in (text or '').replace(',', ' ').split():
+        try:
+            holidays.add(date.fromisoformat(token))
+        except ValueError:
+            raise SchedulingError(f'неверная дата праздника: {token}')
+    return holidays
+
+
+def expand_weekly(group_id, first_day, until, weekdays, at, duration_minutes=60, holidays=()):
+    """Слоты по дням недели ``weekdays`` (0 — понедельник) с ``first_day`` по ``until``."""
+    weekdays = set(weekdays)
+    if not weekdays:
+        raise SchedulingError('не выбраны дни недели')
+    if until < first_day:
+        raise SchedulingError('дата окончания раньше начала')
+    check_duration(duration_minutes)
+    slots = []
+    day = first_day
+    while day <= until:
+        if day.weekday() in weekdays and day not in holidays:
+            slots.append(Slot(group_id, datetime.combine(day, at), duration_minutes))
+            if len(slots) > MAX_SERIES_LESSONS:
+                raise SchedulingError(f'серия длиннее {MAX_SERIES_LESSONS} уроков')
+        day += timedelta(days=1)
+    return slots
+
+
+class IntervalIndex:
+    """Отсортированные по началу интервалы на каждый ключ.
+
+    Пересечения с ``[start, end)`` ищутся среди интервалов, начавшихся не
+    раньше ``start - longest`` (``longest`` — самый длинный интервал ключа),
+    поэтому запрос стоит O(log n + k), а не O(n).
+    """
+
+    def __init__(self):
+        self._starts = defaultdict(list)
+        self._items = defaultdict(list)
+        self._longest = defaultdict(timedelta)
+
+    def add(self, key, start, end, ref):
+        starts = self._starts[key]
+        i = bisect_left(starts, start)
+        starts.insert(i, start)
+        self._items[key].insert(i, (start, end, ref))
+        self._longest[key] = max(self._longest[key], end - start)
+
+    def overlapping(self, key, start, end):
+        starts = self._starts.get(key)
+        if not starts:
+            return []
+        lo = bisect_left(starts, start - self._longest[key])
+        hi = bisect_left(starts, end)
+        return [item for item in self._items[key][lo:hi] if item[1] > start]
+
+
+def _resources(group):
+    teacher_id, location = group
+    keys = []
+    if teacher_id is not None:
+        keys.append(('teacher', teacher_id))
+    if location and location.strip():
+        keys.append(('location', location.strip()))
+    return keys
+
+
+def find_conflicts(slots):
+    """Пересечения слотов с существующими уроками и между собой, по времени начала."""
+    if not slots:
+        return []
+    for slot in slots:
+        check_duration(slot.duration_minutes)
+    group_ids = {s.group_id for s in slots}
+    groups = {
+        gid: (teacher_id, location) for gid, teacher_id, location in db.session.execute(
+            select(Group.id, Group.teacher_id, Group.location).where(Group.id.in_(group_ids))
+        )
+    }
+    missing = group_ids - set(groups)
+    if missing:
+        raise SchedulingError(f'группа {min(missing)} не найдена')
+
+    teacher_ids = {t for t, _ in groups.values() if t is not None}
+    locations = {l.strip() for _, l in groups.values() if l and l.strip()}
+    # уроки длиннее MAX_LESSON_MINUTES не бывают — раньше этого окна пересечений нет
+    window_start = min(s.start_dt for s in slots) - timedelta(minutes=MAX_LESSON_MINUTES)
+    window_end = max(slot_end(s) for s in slots)
+
+    index = IntervalIndex()
+    existing = db.session.execute(
+        select(Lesson.id, Lesson.group_id, Lesson.start_dt, Lesson.duration_minutes,
+               Group.teacher_id, Group.location)
+        .join(Group, Group.id == Lesson.group_id)
+        .where(Lesson.start_dt >= window_start, Lesson.start_dt < window_end,
+               or_(Group.teacher_id.in_(teacher_ids), Group.location.in_(locations)))
+    )
+    for lesson_id, group_id, start, duration, teacher_id, location in existing:
+        end = start + timedelta(minutes=duration or 60)
+        for key in _resources((teacher_id, location)):
+            index.add(key, start, end, (lesson_id, group_id))
+
+    conflicts = []
+    for slot in sorted(slots, key=lambda s: s.start_dt):
+        start, end = slot.start_dt, slot_end(slot)
+        for key in _resources(groups[slot.group_id]):
+            for other_start, other_end, (lesson_id, group_id) in index.overlapping(key, start, end):
+                conflicts.append(Conflict(slot, *key, other_start, other_end, lesson_id, group_id))
+            index.add(key, start, end, (None, slot.group_id))
+    return conflicts
+
+
+def create_lessons(slots):
+    """Вставляет слоты одним executemany и коммитит; возвращает число уроков."""
+    if not slots:
+        return 0
+    db.session.execute(insert(Lesson), [
+        {'group_id': s.group_id, 'start_dt': s.start_dt, 'duration_minutes': s.duration_minutes, 'seats_taken': 0}
+        for s in slots
+    ])
+    stats.apply_lessons(db.session.connection(), [(s.start_dt, s.group_id) for s in slots])
+    cache.catalog_changed(db.session)
+    cache.schedule_changed(db.session)
+    db.session.commit()
+    return len(slots)
+
+
+def without_conflicts(slots, conflicts):
+    busy = {c.slot for c in conflicts}
+    return [s for s in slots if s not in busy]
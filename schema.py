@@ -0,0 +1,94 @@
+"""Миграции схемы (Flask-Migrate/Alembic) и проверка индексов.
+
+Миграции лежат в ``migrations/versions`` и применяются ``flask db upgrade``.
+Для SQLite изменения таблиц идут в batch-режиме (пересборка таблицы с
+копированием данных), каждая миграция выполняется в своей транзакции, а
+время каждого шага печатается.
+
+``flask db missing-indexes`` сверяет индексы в живой БД с запросами,
+которые делает приложение (``QUERY_INDEXES``).
+"""
+import os
+import time
+
+import click
+from flask_migrate import Migrate
+from flask_migrate.cli import db as db_cli
+from sqlalchemy import inspect
+
+from models import db
+
+
+# (таблица, колонки) — префикс индекса, нужный запросам приложения
+QUERY_INDEXES = (
+    ('booking', ('lesson_id',), 'записи урока, пересчёт мест, посещаемость'),
+    ('booking', ('student_id',), 'записи студента (/me, /admin/students)'),
+    ('lesson', ('start_dt',), 'расписание с keyset-пагинацией'),
+    ('lesson', ('group_id',), 'уроки группы/преподавателя'),
+    ('payment', ('student_id', 'created_at'), 'история платежей студента'),
+    ('user', ('email',), 'вход и проверка email при регистрации/импорте'),
+    ('student', ('user_id',), 'профиль студента текущего пользователя'),
+    ('teacher', ('user_id',), 'профиль преподавателя текущего пользователя'),
+    ('group', ('teacher_id',), 'группы преподавателя'),
+)
+
+
+class MigrationTimer:
+    def __init__(self):
+        self._last = None
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def on_version_apply(self, ctx, step, heads, run_args):
+        now = time.perf_counter()
+        elapsed = now - (self._last or now)
+        self._last = now
+        revision = step.up_revision
+        direction = 'upgrade' if step.is_upgrade else 'downgrade'
+        click.echo(f'  {direction} {revision.revision}: {revision.doc} ({elapsed:.3f}s)')
+
+
+migration_timer = MigrationTimer()
+
+
+def init_migrations(app):
+    Migrate(
+        app, db,
+        directory=os.path.join(app.root_path, 'migrations'),
+        render_as_batch=True,
+        compare_type=True,
+        transaction_per_migration=True,
+        on_version_apply=migration_timer.on_version_apply,
+    )
+
+
+def _index_prefixes(inspector, table):
+    prefixes = [tuple(inspector.get_pk_constraint(table).get('constrained_columns') or ())]
+    prefixes += [tuple(ix['column_names']) for ix in inspector.get_indexes(table)]
+    prefixes += [tuple(uq['column_names']) for uq in inspector.get_unique_constraints(table)]
+    return prefixes
+
+
+def missing_indexes(engine=None):
+    """Список ``(table, columns, reason)``, для которых в БД нет подходящего индекса."""
+    inspector = inspect(engine or db.engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table, columns, reason in QUERY_INDEXES:
+        if table not in tables:
+            missing.append((table, columns, f'{reason}; таблицы нет'))
+            continue
+        if not any(prefix[:len(columns)] == columns for prefix in _index_prefixes(inspector, table)):
+            missing.append((table, columns, reason))
+    return missing
+
+
+@db_cli.command('missing-indexes')
+def missing_indexes_command():
+    """Показать индексы, нужные запросам приложения, но отсутствующие в БД."""
+    missing = missing_indexes()
+    for table, columns, reason in missing:
+        click.echo(f'⚠️ {table}({", ".join(columns)}) — {reason}')
+    if not missing:
+        click.echo('✅ Все нужные индексы на месте.')
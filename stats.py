@@ -0,0 +1,343 @@
+"""Материализованная статистика для админ-панели.
+
+Вместо COUNT/SUM по всей истории на каждый заход в /admin счётчики
+поддерживаются инкрементально:
+
+* ``StatCounter`` — глобальные счётчики (студенты, записи, выручка, ...);
+* ``DailyStats`` — дневные сводки по дате урока/платежа;
+* ``GroupStats`` — уроки, места и записи по группам (заполняемость).
+
+ORM-изменения Booking/Payment/Lesson/Student/Teacher/Direction ловятся
+в ``after_flush`` и применяются в той же транзакции; смена вместимости
+группы пересчитывает места всех её уроков, как это сделал бы ``rebuild``, а
+перенос урока на другой день или в другую группу — записи и посещения
+затронутых дней и групп (записи переезжают вместе с уроком). Код, который пишет
+в обход ORM (``booking.cancel``, импорт, ``attendance``, ``scheduling``),
+вызывает ``apply_*`` сам. ``rebuild()`` пересчитывает всё с нуля.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import case, delete, event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import (
+    db, Booking, DailyStats, Direction, Group, GroupStats, Lesson, Payment, StatCounter,
+    Student, Teacher,
+)
+
+
+COUNTERS = ('students', 'teachers', 'directions', 'bookings', 'attended', 'payments', 'revenue')
+
+_TABLES = {
+    'counter': (StatCounter.__table__, 'name'),
+    'day': (DailyStats.__table__, 'day'),
+    'group': (GroupStats.__table__, 'group_id'),
+}
+
+
+class Deltas:
+    """Накопитель изменений: ``{(kind, key): {column: delta}}``."""
+
+    def __init__(self):
+        self.rows = defaultdict(lambda: defaultdict(float))
+
+    def add(self, kind, key, sign=1, **columns):
+        if key is None:
+            return
+        row = self.rows[kind, key]
+        for column, value in columns.items():
+            row[column] += sign * value
+
+    def counter(self, name, value, sign=1):
+        self.add('counter', name, sign, value=value)
+
+    def apply(self, connection):
+        for (kind, key), columns in self.rows.items():
+            columns = {c: v for c, v in columns.items() if v}
+            if columns:
+                _upsert(connection, kind, key, columns)
+        self.rows.clear()
+
+
+def _upsert(connection, kind, key, columns):
+    table, pk = _TABLES[kind]
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite if dialect == 'sqlite' else postgresql).insert
+        stmt = insert(table).values({pk: key, **columns})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[pk],
+            set_={c: table.c[c] + stmt.excluded[c] for c in columns},
+        )
+        connection.execute(stmt)
+        return
+    result = connection.execute(
+        update(table).where(table.c[pk] == key).values({c: table.c[c] + v for c, v in columns.items()})
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values({pk: key, **columns}))
+
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def _lesson_info(connection, lesson_id):
+    row = connection.execute(
+        select(Lesson.start_dt, Lesson.group_id).where(Lesson.id == lesson_id)
+    ).first()
+    return (_day(row.start_dt), row.group_id) if row else (None, None)
+
+
+def _capacity(connection, group_id):
+    if group_id is None:
+        return 0
+    return connection.execute(select(Group.capacity).where(Group.id == group_id)).scalar() or 0
+
+
+def _booking(deltas, connection, lesson_id, attended, sign):
+    day, group_id = _lesson_info(connection, lesson_id)
+    attended = 1 if attended else 0
+    deltas.counter('bookings', 1, sign)
+    deltas.counter('attended', attended, sign)
+    deltas.add('day', day, sign, bookings=1, attended=attended)
+    deltas.add('group', group_id, sign, bookings=1, attended=attended)
+
+
+def _payment(deltas, connection, created_at, amount, sign):
+    amount = amount or 0
+    deltas.counter('payments', 1, sign)
+    deltas.counter('revenue', amount, sign)
+    deltas.add('day', _day(created_at or datetime.now()), sign, payments=1, revenue=amount)
+
+
+def _lesson(deltas, connection, start_dt, group_id, sign):
+    seats = _capacity(connection, group_id)
+    deltas.add('day', _day(start_dt), sign, lessons=1, seats=seats)
+    deltas.add('group', group_id, sign, lessons=1, seats=seats)
+
+
+def _capacity_change(deltas, connection, group_id, old, new, skip_lessons=()):
+    """Места уроков группы по новой вместимости; ``skip_lessons`` уже учтены заново."""
+    diff = (new or 0) - (old or 0)
+    if not diff:
+        return
+    lesson_day = func.date(Lesson.start_dt)
+    query = select(lesson_day, func.count(Lesson.id)).where(Lesson.group_id == group_id).group_by(lesson_day)
+    if skip_lessons:
+        query = query.where(Lesson.id.notin_(skip_lessons))
+    for day, lessons in connection.execute(query):
+        deltas.add('day', _parse_day(day), seats=diff * lessons)
+        deltas.add('group', group_id, seats=diff * lessons)
+
+
+def _recount_bookings(connection, days, group_ids):
+    """Записи и посещения дней и групп заново по БД (после переноса урока)."""
+    attended = func.coalesce(func.sum(case((Booking.attended, 1), else_=0)), 0)
+    totals = select(func.count(Booking.id), attended).join(Lesson, Lesson.id == Booking.lesson_id)
+    daily, groups = DailyStats.__table__, GroupStats.__table__
+    for day in days:
+        start = datetime.combine(day, time.min)
+        count, present = connection.execute(
+            totals.where(Lesson.start_dt >= start, Lesson.start_dt < start + timedelta(days=1))
+        ).one()
+        connection.execute(update(daily).where(daily.c.day == day).values(bookings=count, attended=present))
+    for group_id in group_ids:
+        count, present = connection.execute(totals.where(Lesson.group_id == group_id)).one()
+        connection.execute(
+            update(groups).where(groups.c.group_id == group_id).values(bookings=count, attended=present)
+        )
+
+
+_CONTRIBUTIONS = {
+    Booking: (('lesson_id', 'attended'), _booking),
+    Payment: (('created_at', 'amount'), _payment),
+    Lesson: (('start_dt', 'group_id'), _lesson),
+}
+
+_ENTITY_COUNTERS = {Student: 'students', Teacher: 'teachers', Direction: 'directions'}
+
+
+def _values(obj, columns, old=False):
+    state = inspect(obj)
+    values = []
+    for column in columns:
+        history = state.attrs[column].history
+        if old and history.deleted:
+            values.append(history.deleted[0])
+        elif column in state.dict or state.deleted:
+            values.append(state.dict.get(column))
+        else:
+            values.append(getattr(obj, column))
+    return values
+
+
+def apply_booking(connection, lesson_id, attended, sign):
+    """Учесть запись (``sign=1``) или её удаление (``sign=-1``) вне ORM."""
+    deltas = Deltas()
+    _booking(deltas, connection, lesson_id, attended, sign)
+    deltas.apply(connection)
+
+
+def apply_counter(connection, name, delta):
+    """Сдвинуть глобальный счётчик (для массовых вставок в обход ORM)."""
+    deltas = Deltas()
+    deltas.counter(name, delta)
+    deltas.apply(connection)
+
+
+def apply_lessons(connection, lessons):
+    """Учесть уроки ``[(start_dt, group_id), ...]``, вставленные пачкой в обход ORM."""
+    deltas = Deltas()
+    capacities = {}
+    for start_dt, group_id in lessons:
+        if group_id not in capacities:
+            capacities[group_id] = _capacity(connection, group_id)
+        deltas.add('day', _day(start_dt), lessons=1, seats=capacities[group_id])
+        deltas.add('group', group_id, lessons=1, seats=capacities[group_id])
+    deltas.apply(connection)
+
+
+def apply_attendance(connection, lesson_id, delta):
+    """Учесть изменение числа посетивших урок на ``delta``."""
+    day, group_id = _lesson_info(connection, lesson_id)
+    deltas = Deltas()
+    deltas.counter('attended', delta)
+    deltas.add('day', day, attended=delta)
+    deltas.add('group', group_id, attended=delta)
+    deltas.apply(connection)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_stats(session, flush_context):
+    connection = None
+    deltas = Deltas()
+    moved_days, moved_groups = set(), set()
+    for objects, signs in ((session.new, (1,)), (session.deleted, (-1,)), (session.dirty, (-1, 1))):
+        for obj in objects:
+            cls = type(obj)
+            if cls in _ENTITY_COUNTERS:
+                if len(signs) == 1:
+                    deltas.counter(_ENTITY_COUNTERS[cls], 1, signs[0])
+                continue
+            if cls not in _CONTRIBUTIONS:
+                continue
+            columns, contribute = _CONTRIBUTIONS[cls]
+            if len(signs) == 2 and not any(inspect(obj).attrs[c].history.has_changes() for c in columns):
+                continue
+            connection = connection or session.connection()
+            for sign in signs:
+                contribute(deltas, connection, *_values(obj, columns, old=sign < 0), sign)
+            if cls is Lesson and len(signs) == 2:
+                for start_dt, group_id in (_values(obj, columns, old=True), _values(obj, columns)):
+                    moved_days.add(_day(start_dt))
+                    moved_groups.add(group_id)
+    for obj in session.dirty:
+        if isinstance(obj, Group) and inspect(obj).attrs.capacity.history.has_changes():
+            # новые и изменённые в этом flush уроки уже посчитаны с новой вместимостью
+            recounted = [o.id for o in (*session.new, *session.dirty) if isinstance(o, Lesson)]
+            connection = connection or session.connection()
+            old, = _values(obj, ('capacity',), old=True)
+            _capacity_change(deltas, connection, obj.id, old, obj.capacity, recounted)
+    if connection is not None or deltas.rows:
+        connection = connection or session.connection()
+        deltas.apply(connection)
+        # записи перенесённых уроков проще посчитать заново, чем разносить дельтами
+        _recount_bookings(connection, moved_days - {None}, moved_groups - {None})
+
+
+def rebuild():
+    """Пересчитать все таблицы статистики по исходным данным."""
+    db.metadata.create_all(db.engine, tables=[t for t, _ in _TABLES.values()])
+    for table, _ in _TABLES.values():
+        db.session.execute(delete(table))
+
+    attended = func.sum(case((Booking.attended, 1), else_=0))
+    counters = {
+        'students': db.session.scalar(select(func.count(Student.id))),
+        'teachers': db.session.scalar(select(func.count(Teacher.id))),
+        'directions': db.session.scalar(select(func.count(Direction.id))),
+        'payments': db.session.scalar(select(func.count(Payment.id))),
+        'revenue': db.session.scalar(select(func.coalesce(func.sum(Payment.amount), 0))),
+    }
+    bookings, attended_total = db.session.execute(
+        select(func.count(Booking.id), func.coalesce(attended, 0))
+    ).one()
+    counters.update(bookings=bookings, attended=attended_total)
+    db.session.execute(StatCounter.__table__.insert(), [{'name': k, 'value': v} for k, v in counters.items()])
+
+    days = defaultdict(lambda: dict(lessons=0, seats=0, bookings=0, attended=0, payments=0, revenue=0))
+    groups = defaultdict(lambda: dict(lessons=0, seats=0, bookings=0, attended=0))
+    lesson_day = func.date(Lesson.start_dt)
+    for day, group_id, lessons, seats in db.session.execute(
+        select(lesson_day, Lesson.group_id, func.count(Lesson.id), func.coalesce(func.sum(Group.capacity), 0))
+        .outerjoin(Group, Group.id == Lesson.group_id)
+        .group_by(lesson_day, Lesson.group_id)
+    ):
+        _add(days[_parse_day(day)], lessons=lessons, seats=seats)
+        if group_id is not None:
+            _add(groups[group_id], lessons=lessons, seats=seats)
+    for day, group_id, count, present in db.session.execute(
+        select(lesson_day, Lesson.group_id, func.count(Booking.id), func.coalesce(attended, 0))
+        .join(Lesson, Lesson.id == Booking.lesson_id)
+        .group_by(lesson_day, Lesson.group_id)
+    ):
+        _add(days[_parse_day(day)], bookings=count, attended=present)
+        if group_id is not None:
+            _add(groups[group_id], bookings=count, attended=present)
+    payment_day = func.date(Payment.created_at)
+    for day, count, revenue in db.session.execute(
+        select(payment_day, func.count(Payment.id), func.coalesce(func.sum(Payment.amount), 0))
+        .group_by(payment_day)
+    ):
+        _add(days[_parse_day(day)], payments=count, revenue=revenue)
+
+    days.pop(None, None)
+    if days:
+        db.session.execute(DailyStats.__table__.insert(), [{'day': d, **v} for d, v in days.items()])
+    if groups:
+        db.session.execute(GroupStats.__table__.insert(), [{'group_id': g, **v} for g, v in groups.items()])
+    db.session.commit()
+
+
+def _add(row, **values):
+    for column, value in values.items():
+        row[column] += value or 0
+
+
+def _parse_day(value):
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return _day(value)
+
+
+def dashboard_stats(today=None):
+    """Цифры для /admin из предрасчитанных таблиц; не зависит от объёма истории."""
+    today = today or date.today()
+    stats = {name: 0 for name in COUNTERS}
+    stats.update(db.session.execute(select(StatCounter.name, StatCounter.value)).all())
+    for name in COUNTERS:
+        if name != 'revenue':
+            stats[name] = int(stats[name])
+    stats['upcoming_lessons'] = int(db.session.scalar(
+        select(func.coalesce(func.sum(DailyStats.lessons), 0)).where(DailyStats.day >= today)
+    ))
+    stats['attendance_rate'] = stats['attended'] / stats['bookings'] if stats['bookings'] else None
+    stats['groups'] = [
+        {
+            'name': name,
+            'lessons': row.lessons,
+            'fill_rate': row.bookings / row.seats if row.seats else None,
+            'attendance_rate': row.attended / row.bookings if row.bookings else None,
+        }
+        for row, name in db.session.execute(
+            select(GroupStats, Group.name).join(Group, Group.id == GroupStats.group_id).order_by(Group.name)
+        ).all()
+    ]
+    return stats
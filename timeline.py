@@ -0,0 +1,154 @@
+"""Личный кабинет студента из денормализованной таблицы ``BookingSummary``.
+
+В строке лежит всё, что показывает /me: время урока, группа, направление,
+преподаватель, зал и отметка о посещении. Поэтому ближайшие занятия и
+страница истории — это чтение диапазона индекса
+``(student_id, start_dt, booking_id)``, без JOIN и ленивых загрузок,
+сколько бы записей ни накопилось. Платежи тоже листаются keyset-курсором.
+
+Строки пересобираются из исходных таблиц (``refresh``): ORM-изменения
+Booking/Lesson/Group/Direction и имени преподавателя (Teacher/User) ловятся
+в ``after_flush``, а код, который
+пишет в обход ORM (``booking.cancel``, ``attendance``), вызывает
+``refresh`` сам. ``rebuild()`` пересчитывает таблицу целиком.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import delete, event, false, func, inspect, insert, or_, select, tuple_
+from sqlalchemy.orm import Session, aliased
+
+from models import db, Booking, BookingSummary, Direction, Group, Lesson, Payment, Teacher, User
+from queries import decode_cursor, encode_key
+
+
+HISTORY_PAGE_SIZE = 20
+PAYMENTS_PAGE_SIZE = 20
+
+Page = namedtuple('Page', 'items next_cursor')
+
+_SUMMARY_COLUMNS = (
+    'booking_id', 'student_id', 'lesson_id', 'start_dt', 'duration_minutes', 'group_id',
+    'group_name', 'direction_name', 'teacher_name', 'location', 'attended',
+)
+
+# какие изменения каких моделей влияют на строки сводки
+_WATCHED = {
+    Booking: ('booking_ids', ('lesson_id', 'student_id', 'attended')),
+    Lesson: ('lesson_ids', ('start_dt', 'duration_minutes', 'group_id')),
+    Group: ('group_ids', ('name', 'location', 'direction_id', 'teacher_id')),
+    Direction: ('direction_ids', ('name',)),
+    Teacher: ('teacher_ids', ('user_id',)),
+    # имя пользователя попадает в сводку, только если он преподаватель
+    User: ('user_ids', ('name',)),
+}
+
+
+def _source():
+    teacher_user = aliased(User)
+    return (
+        select(
+            Booking.id, Booking.student_id, Booking.lesson_id, Lesson.start_dt, Lesson.duration_minutes,
+            Lesson.group_id, Group.name, Direction.name, teacher_user.name, Group.location,
+            func.coalesce(Booking.attended, false()),
+        )
+        .join(Lesson, Lesson.id == Booking.lesson_id)
+        .outerjoin(Group, Group.id == Lesson.group_id)
+        .outerjoin(Direction, Direction.id == Group.direction_id)
+        .outerjoin(Teacher, Teacher.id == Group.teacher_id)
+        .outerjoin(teacher_user, teacher_user.id == Teacher.user_id)
+    )
+
+
+def refresh(connection, booking_ids=(), lesson_ids=(), group_ids=(), direction_ids=(), teacher_ids=(),
+            user_ids=()):
+    """Пересобирает строки сводки для записей/уроков/групп/направлений/преподавателей."""
+    if user_ids:
+        teacher_ids = set(teacher_ids) | set(connection.scalars(
+            select(Teacher.id).where(Teacher.user_id.in_(user_ids))
+        ))
+    if direction_ids or teacher_ids:
+        group_ids = set(group_ids) | set(connection.scalars(
+            select(Group.id).where(or_(Group.direction_id.in_(direction_ids), Group.teacher_id.in_(teacher_ids)))
+        ))
+    source, target = [], []
+    for ids, source_column, target_column in (
+        (booking_ids, Booking.id, BookingSummary.booking_id),
+        (lesson_ids, Booking.lesson_id, BookingSummary.lesson_id),
+        (group_ids, Lesson.group_id, BookingSummary.group_id),
+    ):
+        if ids:
+            source.append(source_column.in_(list(ids)))
+            target.append(target_column.in_(list(ids)))
+    if not source:
+        return
+    connection.execute(delete(BookingSummary).where(or_(*target)))
+    connection.execute(
+        insert(BookingSummary).from_select(_SUMMARY_COLUMNS, _source().where(or_(*source)))
+    )
+
+
+def rebuild():
+    """Пересчитать ``BookingSummary`` по всем записям."""
+    connection = db.session.connection()
+    connection.execute(delete(BookingSummary))
+    connection.execute(insert(BookingSummary).from_select(_SUMMARY_COLUMNS, _source()))
+    db.session.commit()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_summary(session, flush_context):
+    changed = {}
+    for objects in (session.new, session.dirty, session.deleted):
+        for obj in objects:
+            watched = _WATCHED.get(type(obj))
+            if watched is None:
+                continue
+            key, columns = watched
+            state = inspect(obj)
+            if obj in session.dirty and not any(state.attrs[c].history.has_changes() for c in columns):
+                continue
+            if type(obj) in (Lesson, Teacher, User) and obj in session.new:
+                continue  # у нового урока ещё нет записей, у нового преподавателя — групп
+            # у новых объектов identity появится только после flush
+            changed.setdefault(key, set()).add(state.identity[0] if state.identity else obj.id)
+    if changed:
+        refresh(session.connection(), **changed)
+
+
+def upcoming(student_id, now=None):
+    """Все будущие записи студента по времени."""
+    return db.session.scalars(
+        select(BookingSummary)
+        .where(BookingSummary.student_id == student_id, BookingSummary.start_dt >= (now or datetime.now()))
+        .order_by(BookingSummary.start_dt, BookingSummary.booking_id)
+    ).all()
+
+
+def history(student_id, cursor=None, limit=HISTORY_PAGE_SIZE, now=None):
+    """Прошедшие записи, от свежих к старым, страницами по ``limit``."""
+    q = select(BookingSummary).where(
+        BookingSummary.student_id == student_id, BookingSummary.start_dt < (now or datetime.now())
+    )
+    if cursor:
+        q = q.where(tuple_(BookingSummary.start_dt, BookingSummary.booking_id) < decode_cursor(cursor))
+    rows = db.session.scalars(
+        q.order_by(BookingSummary.start_dt.desc(), BookingSummary.booking_id.desc()).limit(limit + 1)
+    ).all()
+    return _page(rows, limit, lambda r: encode_key(r.start_dt, r.booking_id))
+
+
+def payments(student_id, cursor=None, limit=PAYMENTS_PAGE_SIZE):
+    """Платежи студента, от свежих к старым, страницами по ``limit``."""
+    q = select(Payment).where(Payment.student_id == student_id)
+    if cursor:
+        q = q.where(tuple_(Payment.created_at, Payment.id) < decode_cursor(cursor))
+    rows = db.session.scalars(q.order_by(Payment.created_at.desc(), Payment.id.desc()).limit(limit + 1)).all()
+    return _page(rows, limit, lambda p: encode_key(p.created_at, p.id))
+
+
+def _page(rows, limit, key):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return Page(rows, key(rows[-1]))
+    return Page(rows, None)